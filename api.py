@@ -0,0 +1,313 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import gzip
+import zlib
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, abort, request, stream_with_context, url_for
+from werkzeug.exceptions import HTTPException
+
+from forms import parse_genre_args
+from geo import venues_near
+from models import db, Venue, Artist, Show
+from pagination import decode_cursor, encode_cursor
+from queries import (MAX_CALENDAR_DAYS, FIRST_CALENDAR_DATE, LAST_CALENDAR_DATE, parse_detail_fields,
+                     parse_time_range, time_range_filter, venue_detail, artist_detail, show_day_counts)
+from scheduling import schedule_shows
+from cache import response_cache
+from search import autocomplete, genre_filter, search_with_upcoming_shows
+from serializers import venue_serializer, artist_serializer, show_serializer, to_json
+
+try:
+    import brotli
+except ImportError:  # optional: responses fall back to gzip
+    brotli = None
+
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# responses smaller than this are not worth compressing
+MINIMUM_COMPRESS_SIZE = 500
+
+# number of typeahead suggestions returned by default, and at most
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# nearby venues: default radius in miles, and number returned by default and
+# at most
+NEAR_MILES = 25
+NEAR_LIMIT = 20
+NEAR_MAX_LIMIT = 100
+
+# most rows a ?limit= page of a listing returns; leave ?limit= out to stream
+# the whole listing
+MAX_PAGE_SIZE = 500
+
+
+#----------------------------------------------------------------------------#
+# Helpers.
+#----------------------------------------------------------------------------#
+
+def json_response(value, status=200):
+    return Response(to_json(value), status=status, mimetype='application/json')
+
+
+def parse_fields(serializer):
+    try:
+        return serializer.parse_fields(request.args.get('fields'))
+    except ValueError as error:
+        abort(400, description=str(error))
+
+
+def time_range():
+    try:
+        return parse_time_range(request.args)
+    except ValueError as error:
+        abort(400, description=str(error))
+
+
+def stream_listing(rows, names, dump):
+    # streams a JSON array one element at a time
+    def generate():
+        yield '['
+        separator = ''
+        for row in rows:
+            yield separator + to_json(dump(row, names))
+            separator = ','
+        yield ']'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def keyset_listing(serializer, key_columns, cursor_types, base_query):
+    # ?fields=, ?after= and ?limit= handling shared by the listing endpoints.
+    # The sort key is always selected so that a page's cursor can be built.
+    names = parse_fields(serializer)
+    key_names = [column.key for column in key_columns]
+    selected = serializer.select(names) + [column.label(name) for column, name
+                                           in zip(key_columns, key_names) if name not in names]
+    query = base_query(db.session.query(*selected))
+
+    cursor = request.args.get('after')
+    if cursor is not None:
+        query = query.filter(db.tuple_(*key_columns) > db.tuple_(*decode_cursor(cursor, cursor_types)))
+    query = query.order_by(*key_columns)
+
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        # the whole listing, read through a server-side cursor
+        return stream_listing(query.yield_per(500), names, serializer.dump)
+
+    # one bounded page; the cursor of its last row goes in a Link header
+    limit = min(max(limit, 0), MAX_PAGE_SIZE)
+    rows = query.limit(limit).all()
+    response = stream_listing(rows, names, serializer.dump)
+    if rows and len(rows) == limit:
+        next_cursor = encode_cursor(getattr(rows[-1], name) for name in key_names)
+        next_url = url_for(request.endpoint, **dict(request.args.to_dict(flat=False), after=next_cursor))
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+
+def genre_filtered(model):
+    # base_query for keyset_listing applying ?genre= and ?match=
+    genres, match = parse_genre_args(request.args)
+    if not genres:
+        return lambda query: query
+    return lambda query: query.filter(genre_filter(model, genres, match))
+
+
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+@api.route('/venues')
+def venues():
+    return keyset_listing(venue_serializer, (Venue.id,), (int,), genre_filtered(Venue))
+
+
+# ?lat=&lon=[&miles=][&limit=][&upcoming=1]: the nearest geocoded venues,
+# answered from an in-process KD-tree (see geo.py)
+@api.route('/venues/near')
+def venues_nearby():
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lon', type=float)
+    if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        abort(400, description='lat and lon must be coordinates in degrees')
+    miles = request.args.get('miles', NEAR_MILES, type=float)
+    if miles is None or not miles > 0:
+        abort(400, description='miles must be a positive number')
+    limit = min(max(request.args.get('limit', NEAR_LIMIT, type=int), 1), NEAR_MAX_LIMIT)
+    upcoming = request.args.get('upcoming', '').lower() in ('1', 'true', 'yes')
+
+    data = venues_near(latitude, longitude, miles, limit, upcoming)
+    return json_response({"count": len(data), "data": data})
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    try:
+        names, show_keys = parse_detail_fields(venue_serializer, request.args.get('fields'))
+    except ValueError as error:
+        abort(400, description=str(error))
+    start, end = time_range()
+    data = venue_detail(venue_id, names, show_keys, start, end)
+    if data is None:
+        abort(404)
+    return json_response(data)
+
+
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+
+@api.route('/artists')
+def artists():
+    return keyset_listing(artist_serializer, (Artist.id,), (int,), genre_filtered(Artist))
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    try:
+        names, show_keys = parse_detail_fields(artist_serializer, request.args.get('fields'))
+    except ValueError as error:
+        abort(400, description=str(error))
+    start, end = time_range()
+    data = artist_detail(artist_id, names, show_keys, start, end)
+    if data is None:
+        abort(404)
+    return json_response(data)
+
+
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+@api.route('/shows')
+def shows():
+    start, end = time_range()
+
+    def joined(query):
+        return (query.select_from(Show)
+                .join(Venue, Venue.id == Show.venue_id)
+                .join(Artist, Artist.id == Show.artist_id)
+                .filter(*time_range_filter(start, end)))
+
+    return keyset_listing(show_serializer, (Show.start_time, Show.venue_id, Show.artist_id),
+                          (datetime.fromisoformat, int, int), joined)
+
+
+# ?from=&to= (dates) -> {"YYYY-MM-DD": number of shows starting that day}
+@api.route('/shows/days')
+def show_days():
+    start, end = time_range()
+    if start is None or end is None:
+        abort(400, description='from and to are required')
+    first, last = start.date(), (end - timedelta(microseconds=1)).date()
+    if (last - first).days >= MAX_CALENDAR_DAYS:
+        abort(400, description=f'at most {MAX_CALENDAR_DAYS} days at a time')
+    if first < FIRST_CALENDAR_DATE or last > LAST_CALENDAR_DATE:
+        abort(400, description=f'days must be between {FIRST_CALENDAR_DATE} and {LAST_CALENDAR_DATE}')
+    counts = show_day_counts(first, last)
+    return json_response({day.isoformat(): count for day, count in sorted(counts.items())})
+
+
+@api.route('/shows', methods=['POST'])
+def create_shows():
+    # {"mode": "atomic" | "best_effort", "shows": [{"venue_id", "artist_id",
+    # "start_time", optional "duration_minutes" and "rrule"}, ...]} -> per-show
+    # results
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('shows'), list):
+        abort(400, description='expected a JSON object with a "shows" list')
+    try:
+        created, results = schedule_shows(body['shows'], body.get('mode', 'atomic'))
+    except ValueError as error:
+        abort(400, description=str(error))
+    return json_response({"created": created, "results": results}, 201 if created else 422)
+
+
+#----------------------------------------------------------------------------#
+# Search.
+#----------------------------------------------------------------------------#
+
+@api.route('/search/<any(venues, artists):kind>')
+def search(kind):
+    model = Venue if kind == 'venues' else Artist
+    genres, match = parse_genre_args(request.args)
+    count, data = search_with_upcoming_shows(model, request.args.get('q', ''),
+                                             limit=request.args.get('limit', type=int),
+                                             offset=request.args.get('offset', 0, type=int),
+                                             genres=genres, match=match)
+    return json_response({"count": count, "data": data})
+
+
+# typeahead for the show form: answered from an in-memory prefix index, and
+# cached per term until a record of that kind changes (bookings don't)
+@api.route('/autocomplete/<any(venues, artists):kind>')
+@response_cache.cached()
+def autocomplete_names(kind):
+    model = Venue if kind == 'venues' else Artist
+    response_cache.tag(f'{model.__tablename__}-records')
+    limit = min(max(request.args.get('limit', AUTOCOMPLETE_LIMIT, type=int), 0), AUTOCOMPLETE_MAX_LIMIT)
+    return json_response(autocomplete(model, request.args.get('q', ''), limit))
+
+
+#----------------------------------------------------------------------------#
+# Errors and compression.
+#----------------------------------------------------------------------------#
+
+# status-specific handlers are needed to take precedence over the app's
+# HTML 404/500 pages
+@api.errorhandler(400)
+@api.errorhandler(404)
+@api.errorhandler(500)
+@api.errorhandler(HTTPException)
+def http_error(error):
+    return json_response({"error": error.name, "message": error.description}, error.code)
+
+
+def _compress_chunks(chunks, compressor, flush):
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = compressor(chunk)
+        if data:
+            yield data
+    yield flush()
+
+
+@api.after_request
+def compress(response):
+    # brotli when available and accepted, otherwise gzip; streamed listings are
+    # compressed chunk by chunk so they stay streamed
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        encoding = 'br'
+    elif accepted['gzip']:
+        encoding = 'gzip'
+    else:
+        return response
+
+    if response.is_streamed:
+        if encoding == 'br':
+            compressor = brotli.Compressor()
+            chunks = _compress_chunks(response.response, compressor.process, compressor.finish)
+        else:
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            chunks = _compress_chunks(response.response, compressor.compress, compressor.flush)
+        response.response = chunks
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < MINIMUM_COMPRESS_SIZE:
+            return response
+        response.set_data(brotli.compress(data) if encoding == 'br' else gzip.compress(data, 6))
+
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,4 @@
+# Benchmarks behind the fab tasks of the same purpose (see fabfile.py). Each
+# module runs on its own, from the repository root:
+#
+#     python -m benchmarks.genre_filter 100000 5
@@ -0,0 +1,101 @@
+#----------------------------------------------------------------------------#
+# Connection pool load test.
+#----------------------------------------------------------------------------#
+# `clients` threads sharing one worker's pool, requesting pages (and every
+# tenth one creating a venue) against DATABASE_URL, a Postgres database
+# whose tables are dropped. The server-side connection count should stay
+# within the pool limit (DB_POOL_SIZE + DB_MAX_OVERFLOW) and drop back once
+# idle.
+#
+#     DATABASE_URL=postgresql://... python -m benchmarks.connections CLIENTS REQUESTS
+import sys
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from app import app
+from models import db, Venue, Artist
+
+
+PAGES = ['/venues', '/artists', '/shows', '/venues/1', '/artists/1', '/api/v1/venues']
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    for number in range(20):
+        db.session.add(Venue(name='Venue {}'.format(number), city='City', state='CA', address='1 Main St',
+                             genres=['Jazz']))
+        db.session.add(Artist(name='Artist {}'.format(number), city='City', state='CA', genres=['Jazz']))
+    db.session.commit()
+
+
+def client_loop(number, requests_each, failures):
+    client = app.test_client()
+    for request_number in range(requests_each):
+        if request_number % 10 == 9:
+            response = client.post('/venues/create', data={
+                'name': 'New {} {}'.format(number, request_number), 'city': 'City', 'state': 'CA',
+                'address': '1 Main St', 'genres': ['Jazz']})
+        else:
+            response = client.get(PAGES[(number + request_number) % len(PAGES)])
+        if response.status_code >= 500:
+            failures.append(response.status_code)
+
+
+def main(clients=100, requests_each=20):
+    with app.app_context():
+        seed()
+
+    # counted on a connection of its own, outside the pool being measured
+    # (autocommit: pg_stat_activity is read once per transaction)
+    monitor = create_engine(app.config['SQLALCHEMY_DATABASE_URI'], poolclass=NullPool,
+                            isolation_level='AUTOCOMMIT').connect()
+
+    def server_connections():
+        return monitor.execute(text("SELECT count(*) FROM pg_stat_activity "
+                                    "WHERE datname = current_database() AND pid <> pg_backend_pid()")).scalar()
+
+    pool = db.get_engine(app).pool
+    samples = []
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            samples.append((pool.checkedout(), server_connections()))
+            time.sleep(0.01)
+
+    failures = []
+    baseline = server_connections()
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client_loop, args=(number, requests_each, failures))
+               for number in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    sampler.join()
+
+    limit = app.config['DB_POOL_SIZE'] + app.config['DB_MAX_OVERFLOW']
+    print('{} clients x {} requests in {:.1f}s, {} server errors'.format(
+        clients, requests_each, elapsed, len(failures)))
+    print('checked out: peak {} (pool limit {}); server connections: {} before, peak {}, {} after'.format(
+        max(checked_out for checked_out, _ in samples), limit, baseline,
+        max(server for _, server in samples), server_connections()))
+    print('(overflow connections are closed as they are returned, so the server can briefly')
+    print(' count one that is still exiting next to its replacement)')
+    print('pool: {}'.format(pool.status()))
+    monitor.close()
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,58 @@
+#----------------------------------------------------------------------------#
+# Datetime filter benchmark.
+#----------------------------------------------------------------------------#
+# Median per-row cost of the `datetime` template filter, as it was (dateutil
+# + Babel on every row) vs now (datetime input, compiled pattern, memoized
+# strings).
+#
+#     python -m benchmarks.datetime_filter ROWS RUNS
+import sys
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from app import app  # also sets up the collections.Callable alias dateutil 2.6 needs
+from views import DATETIME_FORMATS, format_datetime, format_datetime_cached, compiled_datetime_pattern
+
+
+def before(value, format='medium'):
+    # the filter before the change: views passed str(start_time), parsed
+    # again here, and Babel parsed the pattern on every call
+    return babel.dates.format_datetime(dateutil.parser.parse(value), DATETIME_FORMATS[format], locale='en')
+
+
+def per_row_us(function, inputs, runs, cold=False):
+    timings = []
+    for _ in range(runs):
+        if cold:
+            format_datetime_cached.cache_clear()
+            compiled_datetime_pattern.cache_clear()
+        started = time.perf_counter()
+        for value in inputs:
+            function(value, 'full')
+        timings.append((time.perf_counter() - started) / len(inputs) * 1e6)
+    return sorted(timings)[runs // 2]
+
+
+def main(rows=2000, runs=5):
+    with app.app_context():
+        report(rows, runs)
+
+
+def report(rows, runs):
+    start = datetime(2035, 4, 1, 20)
+    values = [start + timedelta(hours=7 * number) for number in range(rows)]
+    strings = [str(value) for value in values]
+    assert [before(value, 'full') for value in strings] == [format_datetime(value, 'full') for value in values]
+
+    print('{} start times, per row:'.format(rows))
+    print('  before (string parsed, pattern parsed):    {:6.2f}us'.format(per_row_us(before, strings, runs)))
+    print('  after, first time each value is seen:      {:6.2f}us'.format(
+        per_row_us(format_datetime, values, runs, cold=True)))
+    print('  after, values repeated (as in listings):   {:6.2f}us'.format(per_row_us(format_datetime, values, runs)))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
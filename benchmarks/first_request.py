@@ -0,0 +1,51 @@
+#----------------------------------------------------------------------------#
+# First request benchmark.
+#----------------------------------------------------------------------------#
+# Median time a fresh worker takes to serve its first pages, compiling
+# templates on the spot vs loading them from a cache filled by `flask
+# templates compile`.
+#
+#     python -m benchmarks.first_request RUNS
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# pages that render templates without touching the database
+FIRST_REQUEST_PATHS = ('/', '/venues/create', '/artists/create', '/shows/create')
+
+
+def first_pages_ms():
+    # run in a fresh interpreter: the time its app takes to serve the pages
+    from app import app
+    client = app.test_client()
+    start = time.perf_counter()
+    for path in FIRST_REQUEST_PATHS:
+        client.get(path)
+    return (time.perf_counter() - start) * 1000
+
+
+def fresh_worker_ms(cache_dir):
+    result = subprocess.run(
+        [sys.executable, '-c', 'from benchmarks.first_request import first_pages_ms; print(first_pages_ms())'],
+        env=dict(os.environ, TEMPLATE_CACHE_DIR=cache_dir), capture_output=True, text=True, check=True)
+    return float(result.stdout.splitlines()[-1])
+
+
+def main(runs=5):
+    cache_dir = tempfile.mkdtemp()
+    try:
+        subprocess.run(['flask', 'templates', 'compile'], check=True,
+                       env=dict(os.environ, TEMPLATE_CACHE_DIR=cache_dir, FLASK_APP='app'))
+        for label, setting in (('compiled per worker', ''), ('bytecode cache', cache_dir)):
+            timings = sorted(fresh_worker_ms(setting) for _ in range(runs))
+            print('{}: {:.1f}ms (median of {} runs)'.format(label, timings[len(timings) // 2], runs))
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,69 @@
+#----------------------------------------------------------------------------#
+# Genre filter benchmark.
+#----------------------------------------------------------------------------#
+# Median time to find the venues with some genres among `rows` venues,
+# loading every venue and filtering in Python vs genre_filter (GIN index on
+# Postgres, in-process index on sqlite). Runs against DATABASE_URL, whose
+# tables are dropped.
+#
+#     DATABASE_URL=sqlite:// python -m benchmarks.genre_filter ROWS RUNS
+import random
+import sys
+import time
+
+from app import app
+from forms import GENRES
+from models import db, Venue
+from search import genre_filter
+
+
+def seed(rows):
+    random.seed(0)
+    db.drop_all()
+    db.create_all()
+    for first in range(0, rows, 5000):
+        db.session.execute(Venue.__table__.insert(), [
+            dict(name='Venue {}'.format(number), city='City', state='CA', address='1 Main St',
+                 genres=random.sample(GENRES, random.randint(1, 3)))
+            for number in range(first, min(first + 5000, rows))])
+    db.session.commit()
+
+
+def median_ms(function, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        found = function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[runs // 2], found
+
+
+def scan(wanted, match):
+    # every venue's genres, filtered in Python
+    test = set(wanted).issubset if match == 'all' else set(wanted).intersection
+    return [venue_id for venue_id, genres in db.session.query(Venue.id, Venue.genres) if test(genres or ())]
+
+
+def filtered(wanted, match):
+    return [venue_id for venue_id, in db.session.query(Venue.id).filter(genre_filter(Venue, wanted, match))]
+
+
+def main(rows=100000, runs=5):
+    with app.app_context():
+        seed(rows)
+        try:
+            filtered(['Jazz'], 'all')  # sqlite builds its genre index here
+            print('{} venues on {}'.format(rows, db.engine.dialect.name))
+            for wanted, match in ((['Jazz'], 'all'), (['Jazz', 'Blues'], 'all'), (['Jazz', 'Blues'], 'any')):
+                scan_ms, expected = median_ms(lambda: scan(wanted, match), runs)
+                filter_ms, found = median_ms(lambda: filtered(wanted, match), runs)
+                assert sorted(found) == sorted(expected)
+                print('{:<20} {:>7} matches  scan {:8.1f}ms  genre_filter {:8.1f}ms'.format(
+                    match + ' ' + '+'.join(wanted), len(found), scan_ms, filter_ms))
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,34 @@
+#----------------------------------------------------------------------------#
+# Import time benchmark.
+#----------------------------------------------------------------------------#
+# Median time to import the app in a fresh interpreter (what every worker
+# and CLI invocation pays), plus the slowest top-level imports.
+#
+#     python -m benchmarks.import_time RUNS
+import subprocess
+import sys
+
+
+def import_timings():
+    # [(cumulative microseconds, module name with its nesting indent), ...]
+    # for one `import app`, innermost imports first
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            capture_output=True, text=True, check=True)
+    timings = [line.split('|') for line in result.stderr.splitlines() if line.startswith('import time:')]
+    return [(int(cumulative), name.rstrip()) for _, cumulative, name in timings[1:]]
+
+
+def main(runs=5):
+    totals = []
+    for _ in range(runs):
+        timings = import_timings()
+        totals.append(timings[-1][0])
+    totals.sort()
+    print('import app: {:.1f}ms (median of {} runs)'.format(totals[len(totals) // 2] / 1000.0, runs))
+    top_level = [timing for timing in timings if timing[1].startswith('   ') and not timing[1].startswith('    ')]
+    for cumulative, name in sorted(top_level)[-10:]:
+        print('{:>9.1f}ms {}'.format(cumulative / 1000.0, name.strip()))
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,310 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, g, request, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from models import Venue, Artist, Show
+from routing import pinned_to_primary
+from versions import bump_versions, read_versions, shard_name, unsharded
+
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class CacheBackend:
+    # Storage used by ResponseCache. The operations mirror a small subset of
+    # Redis (GET, SET EX, DEL, SADD, SMEMBERS + DEL) so that a Redis-compatible
+    # client can be wrapped to satisfy it and be shared between workers.
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, timeout):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def add_to_set(self, key, member, timeout):
+        raise NotImplementedError
+
+    def pop_set(self, key):
+        # returns and removes all members of the set stored at key
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class NullCacheBackend(CacheBackend):
+    # caching disabled
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def add_to_set(self, key, member, timeout):
+        pass
+
+    def pop_set(self, key):
+        return set()
+
+    def clear(self):
+        pass
+
+
+class LRUCacheBackend(CacheBackend):
+    # In-process cache holding at most max_entries items, each expiring after
+    # its timeout. Least recently used items are evicted first.
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_live(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def _put(self, key, value, timeout):
+        self._items[key] = (time.monotonic() + timeout, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            return self._get_live(key)
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._put(key, value, timeout)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._items.pop(key, None)
+
+    def add_to_set(self, key, member, timeout):
+        with self._lock:
+            members = self._get_live(key)
+            if members is None:
+                members = set()
+            members.add(member)
+            self._put(key, members, timeout)
+
+    def pop_set(self, key):
+        with self._lock:
+            members = self._get_live(key)
+            self._items.pop(key, None)
+            return members or set()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+BACKENDS = {
+    'null': NullCacheBackend,
+    'lru': LRUCacheBackend,
+}
+
+
+#----------------------------------------------------------------------------#
+# Response cache.
+#----------------------------------------------------------------------------#
+
+class ResponseCache:
+    # Caches rendered GET responses, keyed by path and query string. Every
+    # entry is registered under tags such as 'venue:3' or 'shows'; model
+    # changes evict exactly the tags they affect (see invalidate_on_commit).
+    # Entries also record the versions of their tags (see versions.py) and
+    # are only served while those are current, so a write made through
+    # another worker, or a CLI command, is never answered from this one's
+    # cache: a hit costs one primary key lookup instead of the page queries.
+
+    def __init__(self, app=None):
+        self.backend = NullCacheBackend()
+        self.enabled = False
+        self.default_timeout = 60
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'lru')
+        if isinstance(backend, str):
+            backend_class = BACKENDS[backend]
+            backend = backend_class(app.config.get('CACHE_MAX_ENTRIES', 1000)) \
+                if backend_class is LRUCacheBackend else backend_class()
+        self.backend = backend
+        self.enabled = not isinstance(backend, NullCacheBackend)
+        self.default_timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 60)
+        app.extensions['response_cache'] = self
+
+    def tag(self, *tags):
+        # adds tags to the response being cached in this request, e.g. the
+        # artists appearing on a venue page
+        g.setdefault('cache_tags', set()).update(tags)
+
+    def get_many(self, keys):
+        # {key: value} for the keys cached with set() and still current
+        entries = {key: self.backend.get('value:' + key) for key in keys} if self.enabled else {}
+        entries = {key: entry for key, entry in entries.items() if entry is not None}
+        current = read_versions(tag for value, versions in entries.values() for tag in versions)
+        return {key: value for key, (value, versions) in entries.items()
+                if all(current[tag] == version for tag, version in versions.items())}
+
+    def set(self, key, value, versions, timeout=None):
+        # caches a value other than a response (e.g. a per-day aggregate);
+        # `versions` are those of its tags, read before computing it
+        if not self.enabled:
+            return
+        entry_timeout = timeout or self.default_timeout
+        self.backend.set('value:' + key, (value, versions), entry_timeout)
+        for entry_tag in versions:
+            self.backend.add_to_set('tag:' + entry_tag, 'value:' + key, entry_timeout)
+
+    def cached(self, *tags, timeout=None):
+        # tags are formatted with the view arguments: 'venue:{venue_id}'
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # pages showing flashed messages are specific to one visitor,
+                # and one who just wrote must see it: no page rendered from
+                # a lagging replica (see routing.py)
+                if (not self.enabled or request.method != 'GET' or '_flashes' in session
+                        or pinned_to_primary()):
+                    return view(*args, **kwargs)
+
+                key = 'view:' + request.full_path
+                cached_response = self.backend.get(key)
+                if cached_response is not None:
+                    body, mimetype, versions = cached_response
+                    if read_versions(versions) == versions:
+                        return Response(body, mimetype=mimetype)
+
+                # versions are read before rendering, so a write committed
+                # meanwhile leaves the entry stale rather than served. Tags
+                # added by the view itself can only be read afterwards.
+                view_tags = {tag.format(**kwargs) for tag in tags}
+                versions = read_versions(view_tags)
+                self.tag(*view_tags)
+                response = view(*args, **kwargs)
+                if isinstance(response, str):
+                    response = Response(response)
+
+                if response.status_code == 200 and not response.is_streamed:
+                    entry_tags = g.pop('cache_tags', set())
+                    versions.update(read_versions(entry_tags - view_tags))
+                    entry_timeout = timeout or self.default_timeout
+                    self.backend.set(key, (response.get_data(), response.mimetype, versions), entry_timeout)
+                    for entry_tag in entry_tags:
+                        self.backend.add_to_set('tag:' + entry_tag, key, entry_timeout)
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate(self, *tags):
+        for entry_tag in tags:
+            keys = self.backend.pop_set('tag:' + entry_tag)
+            if keys:
+                self.backend.delete(*keys)
+
+
+response_cache = ResponseCache()
+
+
+#----------------------------------------------------------------------------#
+# Model-driven invalidation.
+#----------------------------------------------------------------------------#
+
+def _tags_for(target):
+    # 'venue:3' is venue 3's own page, 'venue-info:3' any page displaying its
+    # name or image (likewise for artists). 'venue-records' changes with the
+    # venue rows themselves but not with their shows (see search.py). The
+    # listing tags are bumped one shard at a time (see versions.py).
+    # Records inserted in bulk without an id have no page cached yet.
+    if isinstance(target, Venue):
+        tags = {'venue-records', shard_name('venues', target.id), shard_name('shows', target.id)}
+        if target.id is not None:
+            tags.update((f'venue:{target.id}', f'venue-info:{target.id}'))
+        return tags
+    if isinstance(target, Artist):
+        tags = {'artist-records', shard_name('artists', target.id), shard_name('shows', target.id)}
+        if target.id is not None:
+            tags.update((f'artist:{target.id}', f'artist-info:{target.id}'))
+        return tags
+    if isinstance(target, Show):
+        # 'shows-day:2026-10-18' is that day's show count (see
+        # show_day_counts); the venue directory shows upcoming show counts
+        return {f'venue:{target.venue_id}', f'artist:{target.artist_id}',
+                shard_name('venues', target.venue_id), shard_name('shows', target.venue_id),
+                f'shows-day:{target.start_time.date().isoformat()}'}
+    return set()
+
+
+def _collect_tags(mapper, connection, target):
+    # flushes only record what changed; entries are evicted once the
+    # transaction commits, so a rollback leaves the cache untouched
+    target_session = object_session(target)
+    if target_session is not None:
+        tags = _tags_for(target)
+        target_session.info.setdefault('cache_tags', set()).update(tags)
+        target_session.info.setdefault('unversioned_tags', set()).update(tags)
+
+
+for _model in (Venue, Artist, Show):
+    for _event_name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event_name, _collect_tags)
+
+
+@event.listens_for(Session, 'after_flush')
+def bump_flushed_versions(flushed_session, flush_context):
+    # in the flush's transaction, so other workers see the new versions
+    # exactly when they can see the changes
+    tags = flushed_session.info.pop('unversioned_tags', None)
+    if tags:
+        bump_versions(flushed_session.connection(), tags)
+
+
+def collect_tags(target_session, targets):
+    # for writes that bypass the mapper events, e.g. multi-row INSERTs; call
+    # it in the writing transaction
+    tags = set()
+    for target in targets:
+        tags.update(_tags_for(target))
+    target_session.info.setdefault('cache_tags', set()).update(tags)
+    bump_versions(target_session.connection(), tags)
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_on_commit(committed_session):
+    tags = committed_session.info.pop('cache_tags', None)
+    if tags:
+        response_cache.invalidate(*{unsharded(tag) for tag in tags})
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_on_rollback(rolled_back_session):
+    rolled_back_session.info.pop('cache_tags', None)
+    rolled_back_session.info.pop('unversioned_tags', None)
@@ -0,0 +1,481 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import csv
+import io
+import json
+import os
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, ScriptInfo
+from jinja2 import TemplateSyntaxError
+from sqlalchemy import exc
+
+from cache import collect_tags
+from conflicts import check_start_time, find_conflicts
+from counters import advance_show_counters, rebuild_show_counters
+from models import db, Venue, Artist, Show, DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
+from versions import bump_versions
+
+
+#----------------------------------------------------------------------------#
+# Record kinds.
+#----------------------------------------------------------------------------#
+
+VENUE_FIELDS = ('id', 'name', 'city', 'state', 'address', 'phone', 'image_link', 'genres',
+                'facebook_link', 'website_link', 'seeking_talent', 'seeking_description',
+                'latitude', 'longitude')
+ARTIST_FIELDS = ('id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+                 'facebook_link', 'website_link', 'seeking_venue', 'seeking_description')
+SHOW_FIELDS = ('venue_id', 'artist_id', 'start_time', 'duration_minutes')
+
+KINDS = {
+    'venues': {'model': Venue, 'fields': VENUE_FIELDS, 'required': ('name', 'city', 'state', 'address')},
+    'artists': {'model': Artist, 'fields': ARTIST_FIELDS, 'required': ('name', 'city', 'state')},
+    # shows may reference venues/artists by id or by (unique) name
+    'shows': {'model': Show, 'fields': SHOW_FIELDS, 'required': ('start_time',)},
+}
+
+INTEGER_FIELDS = {'id', 'venue_id', 'artist_id', 'duration_minutes'}
+FLOAT_FIELDS = {'latitude', 'longitude'}
+BOOLEAN_FIELDS = {'seeking_talent', 'seeking_venue'}
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'', '0', 'false', 'f', 'no', 'n'}
+
+
+def _format_from(stream, fmt):
+    if fmt:
+        return fmt
+    return 'jsonl' if os.path.splitext(getattr(stream, 'name', ''))[1] in ('.jsonl', '.json') else 'csv'
+
+
+#----------------------------------------------------------------------------#
+# Parsing.
+#----------------------------------------------------------------------------#
+
+def _read_rows(stream, fmt):
+    # yields (line number, raw dict) without loading the whole file
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_no, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield line_no, json.loads(line)
+                except ValueError as error:
+                    yield line_no, error
+
+
+def _convert(field, value):
+    if isinstance(value, str):
+        value = value.strip()
+    if field in BOOLEAN_FIELDS:
+        if isinstance(value, bool):
+            return value
+        if str(value).lower() in TRUE_VALUES:
+            return True
+        if str(value).lower() in FALSE_VALUES:
+            return False
+        raise ValueError(f'{field} is not a boolean: {value!r}')
+    if value in ('', None):
+        return None
+    if field in INTEGER_FIELDS:
+        return int(value)
+    if field in FLOAT_FIELDS:
+        return float(value)
+    if field == 'genres':
+        return [genre.strip() for genre in value.split(',')] if isinstance(value, str) else list(value)
+    if field == 'start_time':
+        if not isinstance(value, str):
+            raise ValueError(f'start_time is not a date/time: {value!r}')
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+        if value.tzinfo is not None:
+            # start times are stored as naive local times
+            value = value.astimezone().replace(tzinfo=None)
+        check_start_time(value)
+        return value
+    return value
+
+
+def _normalize(kind, raw):
+    # raises ValueError with a message for the per-row error report
+    if not isinstance(raw, dict):
+        raise ValueError(f'not a record: {raw}')
+    spec = KINDS[kind]
+    row = {}
+    for field in spec['fields']:
+        if field in raw:
+            row[field] = _convert(field, raw[field])
+    if kind == 'shows':
+        for name in ('venue_name', 'artist_name'):
+            if raw.get(name):
+                if not isinstance(raw[name], str):
+                    raise ValueError(f'{name} is not a string: {raw[name]!r}')
+                row[name] = raw[name].strip()
+        duration_minutes = row.get('duration_minutes')
+        if duration_minutes is not None and not 0 < duration_minutes <= MAX_SHOW_MINUTES:
+            raise ValueError(f'duration_minutes must be between 1 and {MAX_SHOW_MINUTES}')
+        if row.get('venue_id') is None and 'venue_name' not in row:
+            raise ValueError('venue_id or venue_name is required')
+        if row.get('artist_id') is None and 'artist_name' not in row:
+            raise ValueError('artist_id or artist_name is required')
+    missing = [field for field in spec['required'] if row.get(field) is None]
+    if missing:
+        raise ValueError('missing ' + ', '.join(missing))
+    return row
+
+
+#----------------------------------------------------------------------------#
+# Loading.
+#----------------------------------------------------------------------------#
+
+def _resolve_references(batch, errors):
+    # swaps venue_name/artist_name for ids and checks that referenced ids
+    # exist, with one query per side for the whole batch
+    resolved = []
+    lookups = {}
+    for model, id_field, name_field in ((Venue, 'venue_id', 'venue_name'), (Artist, 'artist_id', 'artist_name')):
+        ids = {row[id_field] for _, row in batch if row.get(id_field) is not None}
+        names = {row[name_field] for _, row in batch if row.get(id_field) is None and name_field in row}
+        known_ids = {entity_id for entity_id, in db.session.query(model.id).filter(model.id.in_(ids))} if ids else set()
+        by_name = {}
+        if names:
+            for entity_id, name in db.session.query(model.id, model.name).filter(model.name.in_(names)):
+                by_name.setdefault(name, []).append(entity_id)
+        lookups[id_field] = (name_field, known_ids, by_name)
+
+    for line_no, row in batch:
+        try:
+            for id_field, (name_field, known_ids, by_name) in lookups.items():
+                name = row.pop(name_field, None)
+                if row.get(id_field) is None:
+                    matches = by_name.get(name, [])
+                    if len(matches) != 1:
+                        raise ValueError(f'{name_field} {name!r} matches {len(matches)} records')
+                    row[id_field] = matches[0]
+                elif row[id_field] not in known_ids:
+                    raise ValueError(f'{id_field} {row[id_field]} does not exist')
+        except ValueError as error:
+            errors.append((line_no, str(error)))
+        else:
+            resolved.append((line_no, row))
+    return resolved
+
+
+def _reject_overlaps(batch, errors):
+    # drops shows overlapping a booked show or an earlier row of the import:
+    # COPY goes around the checks the app makes (see conflicts.py), and on
+    # sqlite nothing else would catch them
+    conflicts = find_conflicts([(row['venue_id'], row['artist_id'], row['start_time'],
+                                 row.get('duration_minutes') or DEFAULT_SHOW_MINUTES) for _, row in batch])
+    accepted = []
+    for (line_no, row), conflict in zip(batch, conflicts):
+        if conflict is None:
+            accepted.append((line_no, row))
+        else:
+            errors.append((line_no, conflict))
+    return accepted
+
+
+def _copy_value(value):
+    # one value in COPY ... WITH (FORMAT csv): unquoted empty is NULL
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        value = 't' if value else 'f'
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, list):
+        value = '{' + ','.join('"' + str(item).replace('\\', '\\\\').replace('"', '\\"') + '"'
+                               for item in value) + '}'
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _insert(table, columns, rows):
+    if db.engine.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(','.join(_copy_value(row.get(column)) for column in columns) + '\n')
+        buffer.seek(0)
+        cursor = db.session.connection().connection.cursor()
+        cursor.copy_expert(f'COPY {table.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+    else:
+        db.session.execute(table.insert(), [{column: row.get(column) for column in columns} for row in rows])
+
+
+def _load_batch(kind, batch, errors):
+    # Inserts a batch with one COPY / executemany per column set. If the batch
+    # is rejected (e.g. a duplicate key), its rows are retried one by one, each
+    # in a savepoint, so only the offending rows are reported and skipped.
+    if kind == 'shows':
+        batch = _reject_overlaps(_resolve_references(batch, errors), errors)
+
+    table = KINDS[kind]['model'].__table__
+    groups = {}
+    for line_no, row in batch:
+        groups.setdefault(tuple(sorted(row)), []).append((line_no, row))
+
+    inserted = []
+    for columns, rows in groups.items():
+        try:
+            with db.session.begin_nested():
+                _insert(table, columns, [row for _, row in rows])
+            inserted.extend(row for _, row in rows)
+        except exc.DBAPIError:
+            for line_no, row in rows:
+                try:
+                    with db.session.begin_nested():
+                        _insert(table, columns, [row])
+                    inserted.append(row)
+                except exc.DBAPIError as error:
+                    errors.append((line_no, str(error.orig).strip().splitlines()[0]))
+    # the inserts bypass the mapper events: bump the versions of what they
+    # change, so running workers drop cached pages and indexes
+    model = KINDS[kind]['model']
+    collect_tags(db.session, [model(**row) for row in inserted])
+    db.session.commit()
+    return len(inserted)
+
+
+def _sync_id_sequence(model):
+    # rows imported with explicit ids leave the serial sequence behind
+    if db.engine.dialect.name == 'postgresql':
+        table = model.__tablename__
+        db.session.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"))
+        db.session.commit()
+
+
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+class MigrateGroup(click.MultiCommand):
+    # `flask db ...`: Flask-Migrate's commands, with Flask-Migrate (and
+    # Alembic) imported only when one of them runs rather than by every
+    # worker and CLI invocation
+
+    def _db_group(self, ctx):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as db_group
+
+        app = ctx.ensure_object(ScriptInfo).load_app()
+        if 'migrate' not in app.extensions:
+            Migrate(app, db)
+        return db_group
+
+    def list_commands(self, ctx):
+        return self._db_group(ctx).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._db_group(ctx).get_command(ctx, name)
+
+
+migrate_cli = MigrateGroup('db', help='Perform database migrations.')
+
+data_cli = AppGroup('data', help='Bulk import and export of venues, artists and shows.')
+
+templates_cli = AppGroup('templates', help='Compiled template cache.')
+
+
+@data_cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='Input format, guessed from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True)
+def import_data(kind, source, fmt, batch_size):
+    """Import KIND records from SOURCE (a CSV/JSONL file, or - for stdin).
+
+    Bad rows are reported with their line number and skipped; the rest of
+    their batch is still imported.
+    """
+    errors = []
+    inserted = 0
+    batch = []
+
+    for line_no, raw in _read_rows(source, _format_from(source, fmt)):
+        try:
+            batch.append((line_no, _normalize(kind, raw)))
+        except (ValueError, TypeError) as error:
+            errors.append((line_no, str(error)))
+        if len(batch) >= batch_size:
+            inserted += _load_batch(kind, batch, errors)
+            batch = []
+    if batch:
+        inserted += _load_batch(kind, batch, errors)
+
+    if kind != 'shows':
+        _sync_id_sequence(KINDS[kind]['model'])
+    elif inserted:
+        # COPY / executemany bypass the Show events maintaining the counters
+        rebuild_show_counters()
+
+    for line_no, message in sorted(errors):
+        click.echo(f'line {line_no}: {message}', err=True)
+    click.echo(f'Imported {inserted} {kind}, {len(errors)} rows rejected.')
+
+
+def _export_value(value, fmt):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list) and fmt == 'csv':
+        return ','.join(value)
+    return value
+
+
+@data_cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(KINDS)))
+@click.argument('destination', type=click.File('w'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='Output format, guessed from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True)
+def export_data(kind, destination, fmt, batch_size):
+    """Export all KIND records to DESTINATION (default: stdout).
+
+    Rows are streamed from a server-side cursor, so memory use does not
+    depend on the size of the table.
+    """
+    fmt = _format_from(destination, fmt)
+    model = KINDS[kind]['model']
+    fields = KINDS[kind]['fields']
+    columns = [getattr(model, field) for field in fields]
+    query = db.session.query(*columns).order_by(*model.__table__.primary_key.columns).yield_per(batch_size)
+
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(destination)
+        writer.writerow(fields)
+
+    count = 0
+    for row in query:
+        values = [_export_value(value, fmt) for value in row]
+        if writer is not None:
+            writer.writerow(values)
+        else:
+            destination.write(json.dumps(dict(zip(fields, values))) + '\n')
+        count += 1
+
+    click.echo(f'Exported {count} {kind}.', err=True)
+
+
+@data_cli.command('refresh-counts')
+@click.option('--rebuild', is_flag=True, help='Recount every counter from the show table.')
+def refresh_counts(rebuild):
+    """Bring the venue/artist show counters up to date.
+
+    Moves shows that have started since the last run from upcoming to past.
+    Run it periodically (e.g. every minute from cron); listings count
+    upcoming shows as of its last run.
+    """
+    if rebuild:
+        click.echo(f'Recounted {rebuild_show_counters()} shows.')
+    else:
+        click.echo(f'Moved {advance_show_counters()} started shows to past.')
+
+
+#----------------------------------------------------------------------------#
+# Geocoding.
+#----------------------------------------------------------------------------#
+
+def _place_key(address, city, state):
+    return (' '.join((address or '').lower().replace(',', ' ').split()),
+            ' '.join((city or '').lower().split()),
+            (state or '').strip().upper())
+
+
+def _read_lookup(stream):
+    # address,city,state,latitude,longitude rows; a row without an address
+    # gives the coordinates used for any other address in that city
+    places = {}
+    for row in csv.DictReader(stream):
+        try:
+            coordinates = (float(row['latitude']), float(row['longitude']))
+        except (KeyError, TypeError, ValueError):
+            continue
+        places[_place_key(row.get('address'), row.get('city'), row.get('state'))] = coordinates
+    return places
+
+
+@data_cli.command('geocode')
+@click.argument('lookup', type=click.File('r'), required=False)
+@click.option('--all', 'redo', is_flag=True, help='Geocode venues that already have coordinates too.')
+def geocode(lookup, redo):
+    """Fill in venue coordinates from LOOKUP, a local CSV file.
+
+    LOOKUP (default: the GEOCODE_LOOKUP_FILE setting) has address, city,
+    state, latitude and longitude columns. Venues are matched on their
+    address, falling back to the row of their city with an empty address.
+    Nothing is looked up over the network.
+    """
+    if lookup is None:
+        path = current_app.config['GEOCODE_LOOKUP_FILE']
+        try:
+            lookup = open(path)
+        except OSError as error:
+            raise click.ClickException(f'cannot read {path}: {error.strerror}')
+    with lookup:
+        places = _read_lookup(lookup)
+
+    query = db.session.query(Venue.id, Venue.address, Venue.city, Venue.state)
+    if not redo:
+        query = query.filter(db.or_(Venue.latitude.is_(None), Venue.longitude.is_(None)))
+
+    params = []
+    missing = 0
+    for venue_id, address, city, state in query.yield_per(1000):
+        key = _place_key(address, city, state)
+        coordinates = places.get(key) or places.get(('',) + key[1:])
+        if coordinates is None:
+            missing += 1
+        else:
+            params.append({'venue_id': venue_id, 'latitude': coordinates[0], 'longitude': coordinates[1]})
+
+    # one executemany for every venue found; bumping venue-records with it
+    # makes running workers rebuild their nearby venue index
+    if params:
+        table = Venue.__table__
+        db.session.execute(table.update()
+                           .where(table.c.id == db.bindparam('venue_id'))
+                           .values(latitude=db.bindparam('latitude'), longitude=db.bindparam('longitude')),
+                           params)
+        bump_versions(db.session.connection(), ['venue-records'])
+        db.session.commit()
+    click.echo(f'Geocoded {len(params)} venues, {missing} not found in the lookup file.')
+
+
+#----------------------------------------------------------------------------#
+# Templates.
+#----------------------------------------------------------------------------#
+
+@templates_cli.command('compile')
+def compile_templates():
+    """Compile every template into TEMPLATE_CACHE_DIR.
+
+    Run at deploy time: workers then load compiled templates from the cache
+    instead of parsing and compiling each one on its first request. Exits
+    with an error if a template does not compile.
+    """
+    env = current_app.jinja_env
+    if env.bytecode_cache is None:
+        raise click.ClickException('TEMPLATE_CACHE_DIR is not set')
+
+    names = env.list_templates(filter_func=lambda name: name.endswith('.html'))
+    errors = []
+    for name in names:
+        try:
+            env.get_template(name)
+        except TemplateSyntaxError as error:
+            errors.append(f'{name}:{error.lineno}: {error.message}')
+
+    for message in errors:
+        click.echo(message, err=True)
+    if errors:
+        raise click.ClickException(f'{len(errors)} of {len(names)} templates failed to compile.')
+    click.echo(f'Compiled {len(names)} templates into {current_app.config["TEMPLATE_CACHE_DIR"]}.')
@@ -0,0 +1,120 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, make_response, request, session
+
+from models import db, Venue, Artist, Show
+from routing import pinned_to_primary
+from versions import read_version
+
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+def conditional(validator):
+    # Answers If-None-Match / If-Modified-Since with a 304 before the view
+    # runs, so neither the template nor the page's join queries are executed.
+    # `validator` receives the view arguments and returns (parts,
+    # last_modified) from one cheap query, or None to skip the check
+    # (e.g. a missing record, which the view turns into a 404).
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # pages showing flashed messages are specific to one visitor,
+            # and one who just wrote gets a fresh page whatever their
+            # browser holds (see routing.py)
+            if request.method != 'GET' or '_flashes' in session or pinned_to_primary():
+                return view(*args, **kwargs)
+
+            validators = validator(**kwargs)
+            if validators is None:
+                return view(*args, **kwargs)
+
+            parts, last_modified = validators
+            etag = hashlib.sha1(repr((request.full_path, parts)).encode()).hexdigest()
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            elif request.if_modified_since and last_modified:
+                not_modified = last_modified.replace(microsecond=0) <= request.if_modified_since
+            else:
+                not_modified = False
+
+            if not_modified:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
+
+
+def _as_utc(value, local=False):
+    # updated_at columns hold UTC; show start times are naive local times
+    if value is None:
+        return None
+    if local:
+        return value.astimezone(timezone.utc)
+    return value.replace(tzinfo=timezone.utc)
+
+
+def _latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+#----------------------------------------------------------------------------#
+# Validators.
+#----------------------------------------------------------------------------#
+
+def _detail_validators(model, show_fk, other_model, other_fk, entity_id):
+    # Everything a venue/artist page depends on: the record itself, its shows,
+    # the other side of each show, and where "now" falls between the shows.
+    # The next upcoming start time changes once that show moves to "past", and
+    # the most recent start time that has passed is when that last happened.
+    now = datetime.now()
+    row = (db.session.query(model.updated_at,
+                            db.func.count(show_fk),
+                            db.func.max(Show.updated_at),
+                            db.func.max(other_model.updated_at),
+                            db.func.min(db.case((Show.start_time >= now, Show.start_time))),
+                            db.func.max(db.case((Show.start_time < now, Show.start_time))))
+           .outerjoin(Show, show_fk == model.id)
+           .outerjoin(other_model, other_model.id == other_fk)
+           .filter(model.id == entity_id)
+           .group_by(model.id)
+           .first())
+    if row is None:
+        return None
+
+    updated_at, show_count, shows_updated_at, others_updated_at, next_upcoming, last_started = row
+    last_modified = _latest(_as_utc(updated_at), _as_utc(shows_updated_at),
+                            _as_utc(others_updated_at), _as_utc(last_started, local=True))
+    return tuple(row), last_modified
+
+
+def venue_validators(venue_id):
+    return _detail_validators(Venue, Show.venue_id, Artist, Show.artist_id, venue_id)
+
+
+def artist_validators(artist_id):
+    return _detail_validators(Artist, Show.artist_id, Venue, Show.venue_id, artist_id)
+
+
+def shows_validators():
+    # the /shows listing depends on every show, venue name and artist
+    # name/image: the shows version is bumped by every write to them,
+    # deletes included, so it and when it last moved are the validators
+    version, changed_at = read_version('shows')
+    return (version,), _as_utc(changed_at)
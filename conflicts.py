@@ -0,0 +1,125 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import bisect
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from models import db, Show, MAX_SHOW_MINUTES
+
+
+# A show overlaps [start, end) when it starts before `end` and is still
+# running at `start`. No show lasts longer than MAX_SHOW_MINUTES, so only
+# shows starting in (start - MAX_SHOW_MINUTES, end) can overlap, and for one
+# venue or artist those are a short range scan on ix_show_venue_id_start_time
+# / ix_show_artist_id_start_time rather than a pass over all of its shows.
+
+LOOKBACK = timedelta(minutes=MAX_SHOW_MINUTES)
+
+# the start times whose overlap window and end still fit in a datetime
+EARLIEST_START = datetime.min + LOOKBACK
+LATEST_START = datetime.max - LOOKBACK
+
+# the entities a show books, and the show column referencing them
+BOOKED = (('venue_id', 'venue'), ('artist_id', 'artist'))
+
+
+def check_start_time(start_time):
+    # ValueError for start times too close to the ends of the calendar to
+    # compute an overlap with
+    if not EARLIEST_START <= start_time <= LATEST_START:
+        raise ValueError(f'start_time must fall between {EARLIEST_START.date()} and {LATEST_START.date()}')
+
+
+def show_end(start_time, duration_minutes):
+    return start_time + timedelta(minutes=duration_minutes)
+
+
+class Bookings:
+    # Start-sorted (start, end) intervals per entity id, loaded for a time
+    # window. An overlap check bisects to the shows starting within
+    # LOOKBACK of the new one, so it costs O(log n) plus the few shows
+    # in that window.
+
+    def __init__(self):
+        self.starts = defaultdict(list)
+        self.intervals = defaultdict(list)
+
+    def add(self, entity_id, start, end):
+        starts = self.starts[entity_id]
+        position = bisect.bisect_right(starts, start)
+        starts.insert(position, start)
+        self.intervals[entity_id].insert(position, (start, end))
+
+    def overlapping(self, entity_id, start, end):
+        # the first booked interval overlapping [start, end), or None
+        starts = self.starts.get(entity_id)
+        if not starts:
+            return None
+        first = bisect.bisect_right(starts, start - LOOKBACK)
+        last = bisect.bisect_left(starts, end)
+        for booked_start, booked_end in self.intervals[entity_id][first:last]:
+            if booked_end > start:
+                return booked_start, booked_end
+        return None
+
+
+def load_bookings(column, entity_ids, start, end):
+    # the shows of `entity_ids` (values of Show.<column>) that may overlap
+    # [start, end), in one query
+    show_column = getattr(Show, column)
+    bookings = Bookings()
+    if entity_ids:
+        rows = (db.session.query(show_column, Show.start_time, Show.duration_minutes)
+                .filter(show_column.in_(entity_ids),
+                        Show.start_time > start - LOOKBACK,
+                        Show.start_time < end))
+        for entity_id, start_time, duration_minutes in rows:
+            bookings.add(entity_id, start_time, show_end(start_time, duration_minutes))
+    return bookings
+
+
+def conflict_message(noun, booked_start):
+    return f'the {noun} already has a show at that time (starting {booked_start:%Y-%m-%d %H:%M})'
+
+
+def find_conflict(venue_id, artist_id, start_time, duration_minutes):
+    # a message if the venue or the artist already has a show overlapping
+    # the new one, else None
+    check_start_time(start_time)
+    end = show_end(start_time, duration_minutes)
+    for column, noun in BOOKED:
+        entity_id = venue_id if column == 'venue_id' else artist_id
+        booked = load_bookings(column, [entity_id], start_time, end).overlapping(entity_id, start_time, end)
+        if booked is not None:
+            return conflict_message(noun, booked[0])
+    return None
+
+
+def find_conflicts(shows):
+    # For (venue_id, artist_id, start_time, duration_minutes) tuples: a
+    # message for each show overlapping a booked one or an earlier show of
+    # the list, else None. One query per side loads the shows of the venues
+    # and artists involved around the list's time span.
+    if not shows:
+        return []
+    ends = [show_end(start_time, duration_minutes) for _, _, start_time, duration_minutes in shows]
+    span_start = min(start_time for _, _, start_time, _ in shows)
+    span_end = max(ends)
+    bookings = {column: load_bookings(column, {show[position] for show in shows}, span_start, span_end)
+                for position, (column, noun) in enumerate(BOOKED)}
+
+    conflicts = []
+    for show, end in zip(shows, ends):
+        start = show[2]
+        conflict = None
+        for position, (column, noun) in enumerate(BOOKED):
+            booked = bookings[column].overlapping(show[position], start, end)
+            if booked is not None:
+                conflict = conflict_message(noun, booked[0])
+                break
+        else:
+            for position, (column, noun) in enumerate(BOOKED):
+                bookings[column].add(show[position], start, end)
+        conflicts.append(conflict)
+    return conflicts
@@ -0,0 +1,146 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from datetime import datetime
+
+from sqlalchemy import event
+
+from models import db, Venue, Artist, Show, CounterCheckpoint
+
+
+# Venue/Artist upcoming_shows_count and past_shows_count. A show counts as
+# upcoming while it starts after the checkpoint; Show inserts and deletes
+# adjust the counters as they are flushed, and `flask data refresh-counts`
+# moves the shows that have started since the last run from upcoming to past
+# and advances the checkpoint. Listings are therefore as fresh as that job
+# (run it every minute or so, from cron or similar).
+
+CHECKPOINT = 'show_counts'
+
+# the entities whose counters a show contributes to, and the show column
+# referencing them
+COUNTED = ((Venue, 'venue_id'), (Artist, 'artist_id'))
+
+
+def _checkpoint(connection, for_update=False):
+    # readers take a shared lock on Postgres, so a refresh cannot move the
+    # checkpoint under a flush classifying new shows against it
+    table = CounterCheckpoint.__table__
+    query = (db.select(table.c.as_of)
+             .where(table.c.name == CHECKPOINT)
+             .with_for_update(read=not for_update))
+    return connection.execute(query).scalar()
+
+
+def _set_checkpoint(connection, as_of):
+    table = CounterCheckpoint.__table__
+    updated = connection.execute(table.update().where(table.c.name == CHECKPOINT).values(as_of=as_of))
+    if not updated.rowcount:
+        connection.execute(table.insert().values(name=CHECKPOINT, as_of=as_of))
+
+
+#----------------------------------------------------------------------------#
+# Show events.
+#----------------------------------------------------------------------------#
+
+def adjust_show_counters(connection, shows, delta):
+    # Adds delta to the counters of the venues and artists of `shows` (Show
+    # instances). Used by the events below, and directly by bulk inserts
+    # that bypass them: one checkpoint read and one statement per counter
+    # column touched, with per-entity totals as executemany parameters.
+    as_of = _checkpoint(connection) or datetime.now()
+    for model, show_column in COUNTED:
+        totals = {}
+        for show in shows:
+            column = 'upcoming_shows_count' if show.start_time > as_of else 'past_shows_count'
+            key = (column, getattr(show, show_column))
+            totals[key] = totals.get(key, 0) + delta
+
+        table = model.__table__
+        for column in ('upcoming_shows_count', 'past_shows_count'):
+            params = [{'entity_id': entity_id, 'delta': total}
+                      for (total_column, entity_id), total in totals.items() if total_column == column]
+            if params:
+                connection.execute(table.update()
+                                   .where(table.c.id == db.bindparam('entity_id'))
+                                   .values({column: table.c[column] + db.bindparam('delta')}),
+                                   params)
+
+
+@event.listens_for(Show, 'after_insert')
+def count_inserted_show(mapper, connection, target):
+    adjust_show_counters(connection, [target], 1)
+
+
+@event.listens_for(Show, 'after_delete')
+def count_deleted_show(mapper, connection, target):
+    adjust_show_counters(connection, [target], -1)
+
+
+#----------------------------------------------------------------------------#
+# Refresh.
+#----------------------------------------------------------------------------#
+
+def advance_show_counters(now=None):
+    # Moves shows starting between the checkpoint and now from upcoming to
+    # past, with one grouped query and one executemany per entity table.
+    # Returns the number of shows moved.
+    now = now or datetime.now()
+    connection = db.session.connection()
+    as_of = _checkpoint(connection, for_update=True)
+    if as_of is None:
+        return rebuild_show_counters(now)
+    if now <= as_of:
+        return 0
+
+    shows = Show.__table__
+    moved = 0
+    for model, show_column in COUNTED:
+        rows = connection.execute(
+            db.select(shows.c[show_column], db.func.count())
+            .where(shows.c.start_time > as_of, shows.c.start_time <= now)
+            .group_by(shows.c[show_column])
+        ).all()
+        if not rows:
+            continue
+        table = model.__table__
+        connection.execute(
+            table.update()
+            .where(table.c.id == db.bindparam('entity_id'))
+            .values(upcoming_shows_count=table.c.upcoming_shows_count - db.bindparam('started'),
+                    past_shows_count=table.c.past_shows_count + db.bindparam('started')),
+            [{'entity_id': entity_id, 'started': started} for entity_id, started in rows]
+        )
+        if model is Venue:
+            moved = sum(started for _, started in rows)
+
+    _set_checkpoint(connection, now)
+    db.session.commit()
+    return moved
+
+
+def rebuild_show_counters(now=None):
+    # Recounts every counter from the show table. Needed once after the
+    # columns are added, and after changes that bypass the ORM (bulk imports;
+    # delete_venue adjusts for the shows its cascade removes itself). Returns
+    # the number of shows.
+    now = now or datetime.now()
+    connection = db.session.connection()
+    shows = Show.__table__
+    for model, show_column in COUNTED:
+        table = model.__table__
+
+        def counted(*conditions):
+            return (db.select(db.func.count())
+                    .where(shows.c[show_column] == table.c.id, *conditions)
+                    .scalar_subquery())
+
+        connection.execute(table.update().values(
+            upcoming_shows_count=counted(shows.c.start_time > now),
+            past_shows_count=counted(shows.c.start_time <= now),
+        ))
+
+    _set_checkpoint(connection, now)
+    total = connection.execute(db.select(db.func.count()).select_from(shows)).scalar()
+    db.session.commit()
+    return total
@@ -6,9 +6,9 @@ from fabric.contrib.console import confirm
 
 def test():
     with settings(warn_only=True):
-        result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
-        )
+        # set TEST_DATABASE_URL to a scratch Postgres database to run the
+        # tests against Postgres as well as sqlite
+        result = local("python -m pytest -q", capture=True)
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
@@ -56,3 +56,43 @@ def deploy():
 
 def rollback():
     local("heroku rollback")
+
+# cold start
+
+
+def importtime(runs=5):
+    # time to import the app in a fresh interpreter, and the slowest
+    # top-level imports (benchmarks/import_time.py)
+    local('python -m benchmarks.import_time {}'.format(runs))
+
+
+def firstrequest(runs=5):
+    # time a fresh worker takes to serve its first pages, with and without
+    # the compiled template cache (benchmarks/first_request.py)
+    local('python -m benchmarks.first_request {}'.format(runs))
+
+
+# genre filters
+
+def genrefilter(rows=100000, runs=5):
+    # genre_filter vs filtering every venue in Python (benchmarks/genre_filter.py),
+    # against TEST_DATABASE_URL, whose tables are dropped, or an in-memory
+    # sqlite db
+    local('DATABASE_URL="${{TEST_DATABASE_URL:-sqlite://}}" python -m benchmarks.genre_filter {} {}'.format(
+        rows, runs))
+
+# datetime filter
+
+def datetimefilter(rows=2000, runs=5):
+    # per-row cost of the `datetime` template filter, before and after
+    # (benchmarks/datetime_filter.py)
+    local('python -m benchmarks.datetime_filter {} {}'.format(rows, runs))
+
+# connection pooling
+
+def connections(clients=100, requests=20):
+    # `clients` threads sharing one worker's pool against TEST_DATABASE_URL,
+    # whose tables are dropped: server connections should stay within the
+    # pool limit (benchmarks/connections.py)
+    local('DATABASE_URL="${{TEST_DATABASE_URL:?needs a Postgres database}}" '
+          'python -m benchmarks.connections {} {}'.format(clients, requests))
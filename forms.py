@@ -1,20 +1,138 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL, Optional, regexp
+from wtforms import (StringField, IntegerField, SelectField, SelectMultipleField, DateTimeField, BooleanField,
+                     TextAreaField)
+from wtforms.validators import DataRequired, InputRequired, NumberRange, Optional, URL, ValidationError, regexp
 
+from conflicts import check_start_time
+from models import db, Venue, Artist, DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
+
+
+#----------------------------------------------------------------------------#
+# Choices.
+#----------------------------------------------------------------------------#
+
+# Built once and shared by VenueForm and ArtistForm; submitted values are
+# checked against the frozensets instead of scanning the choices lists.
+
+STATES = (
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN',
+    'IA', 'KS', 'KY', 'LA', 'ME', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC', 'ND', 'OH',
+    'OK', 'OR', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT',
+    'VT', 'VA', 'WA', 'WV', 'WI', 'WY',
+)
+
+GENRES = (
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+    'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+    'Rock n Roll', 'Soul', 'Other',
+)
+
+STATE_CHOICES = [(state, state) for state in STATES]
+GENRE_CHOICES = [(genre, genre) for genre in GENRES]
+STATE_VALUES = frozenset(STATES)
+GENRE_VALUES = frozenset(GENRES)
+
+# lower-cased genre -> genre as stored, so ?genre=hip-hop finds 'Hip-Hop'
+GENRE_NAMES = {genre.lower(): genre for genre in GENRES}
+
+
+def parse_genre_args(args):
+    # the genre filter of a listing or search: ?genre=Jazz&genre=Blues (or
+    # ?genre=jazz,blues) and ?match=all|any -> (genres, match); no genres
+    # means no filter (see genre_filter in search.py)
+    genres = []
+    for value in args.getlist('genre'):
+        for genre in value.split(','):
+            genre = GENRE_NAMES.get(genre.strip().lower(), genre.strip())
+            if genre and genre not in genres:
+                genres.append(genre)
+    match = 'any' if args.get('match') == 'any' else 'all'
+    return genres, match
+
+
+#----------------------------------------------------------------------------#
+# Validators.
+#----------------------------------------------------------------------------#
+
+class InChoices:
+    # O(1) replacement for the SelectField choice check; accepts a single
+    # value or a list of them (SelectMultipleField)
+    def __init__(self, values, message='Not a valid choice.'):
+        self.values = values
+        self.message = message
+
+    def __call__(self, form, field):
+        data = field.data if isinstance(field.data, (list, tuple)) else [field.data]
+        if any(value not in self.values for value in data):
+            raise ValidationError(self.message)
+
+
+class ExistingId:
+    # rejects ids of venues/artists that do not exist before the INSERT is
+    # attempted, with a primary key lookup (sqlite does not enforce foreign
+    # keys, and elsewhere the failed INSERT would only say "an error occurred")
+    def __init__(self, model, message):
+        self.model = model
+        self.message = message
+
+    def __call__(self, form, field):
+        if field.data is None:
+            return
+        if db.session.query(self.model.id).filter(self.model.id == field.data).first() is None:
+            raise ValidationError(self.message)
+
+
+class SchedulableTime:
+    # start times the overlap checks can handle (see conflicts.py), rather
+    # than an OverflowError from the date arithmetic
+    def __call__(self, form, field):
+        if field.data is None:
+            return
+        try:
+            check_start_time(field.data)
+        except ValueError as error:
+            raise ValidationError(str(error))
+
+
+#----------------------------------------------------------------------------#
+# Forms.
+#----------------------------------------------------------------------------#
 
 class ShowForm(Form):
-    artist_id = StringField(
-        'artist_id'
+    artist_id = IntegerField(
+        'artist_id', validators=[InputRequired(), ExistingId(Artist, 'No artist with this id')]
     )
-    venue_id = StringField(
-        'venue_id'
+    venue_id = IntegerField(
+        'venue_id', validators=[InputRequired(), ExistingId(Venue, 'No venue with this id')]
     )
     start_time = DateTimeField(
         'start_time',
-        validators=[DataRequired()],
-        default= datetime.today()
+        validators=[DataRequired(), SchedulableTime()],
+        # a callable, so the default is the time the form is shown, not imported
+        default=datetime.today
+    )
+    duration_minutes = IntegerField(
+        'duration_minutes', validators=[Optional(), NumberRange(1, MAX_SHOW_MINUTES)],
+        default=DEFAULT_SHOW_MINUTES
+    )
+
+class ScheduleShowsForm(Form):
+    # one "venue_id, artist_id, start_time" per line
+    shows = TextAreaField(
+        'shows', validators=[DataRequired()]
+    )
+    # length of every show listed
+    duration_minutes = IntegerField(
+        'duration_minutes', validators=[Optional(), NumberRange(1, MAX_SHOW_MINUTES)],
+        default=DEFAULT_SHOW_MINUTES
+    )
+    # optional recurrence applied to every line, e.g. FREQ=WEEKLY;COUNT=8
+    rrule = StringField(
+        'rrule', validators=[Optional()]
+    )
+    mode = SelectField(
+        'mode', choices=[('atomic', 'All or nothing'), ('best_effort', 'Schedule the valid shows')]
     )
 
 class VenueForm(Form):
@@ -25,60 +143,8 @@ class VenueForm(Form):
         'city', validators=[DataRequired()]
     )
     state = SelectField(
-        'state', validators=[DataRequired()],
-        choices=[
-            ('AL', 'AL'),
-            ('AK', 'AK'),
-            ('AZ', 'AZ'),
-            ('AR', 'AR'),
-            ('CA', 'CA'),
-            ('CO', 'CO'),
-            ('CT', 'CT'),
-            ('DE', 'DE'),
-            ('DC', 'DC'),
-            ('FL', 'FL'),
-            ('GA', 'GA'),
-            ('HI', 'HI'),
-            ('ID', 'ID'),
-            ('IL', 'IL'),
-            ('IN', 'IN'),
-            ('IA', 'IA'),
-            ('KS', 'KS'),
-            ('KY', 'KY'),
-            ('LA', 'LA'),
-            ('ME', 'ME'),
-            ('MT', 'MT'),
-            ('NE', 'NE'),
-            ('NV', 'NV'),
-            ('NH', 'NH'),
-            ('NJ', 'NJ'),
-            ('NM', 'NM'),
-            ('NY', 'NY'),
-            ('NC', 'NC'),
-            ('ND', 'ND'),
-            ('OH', 'OH'),
-            ('OK', 'OK'),
-            ('OR', 'OR'),
-            ('MD', 'MD'),
-            ('MA', 'MA'),
-            ('MI', 'MI'),
-            ('MN', 'MN'),
-            ('MS', 'MS'),
-            ('MO', 'MO'),
-            ('PA', 'PA'),
-            ('RI', 'RI'),
-            ('SC', 'SC'),
-            ('SD', 'SD'),
-            ('TN', 'TN'),
-            ('TX', 'TX'),
-            ('UT', 'UT'),
-            ('VT', 'VT'),
-            ('VA', 'VA'),
-            ('WA', 'WA'),
-            ('WV', 'WV'),
-            ('WI', 'WI'),
-            ('WY', 'WY'),
-        ]
+        'state', validators=[DataRequired(), InChoices(STATE_VALUES)],
+        choices=STATE_CHOICES, validate_choice=False
     )
     address = StringField(
         'address', validators=[DataRequired()]
@@ -90,29 +156,8 @@ class VenueForm(Form):
         'image_link'
     )
     genres = SelectMultipleField(
-        # TODO implement enum restriction
-        'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        'genres', validators=[DataRequired(), InChoices(GENRE_VALUES)],
+        choices=GENRE_CHOICES, validate_choice=False
     )
     facebook_link = StringField(
         # optional validator so form can be added without a facebook link
@@ -138,60 +183,8 @@ class ArtistForm(Form):
         'city', validators=[DataRequired()]
     )
     state = SelectField(
-        'state', validators=[DataRequired()],
-        choices=[
-            ('AL', 'AL'),
-            ('AK', 'AK'),
-            ('AZ', 'AZ'),
-            ('AR', 'AR'),
-            ('CA', 'CA'),
-            ('CO', 'CO'),
-            ('CT', 'CT'),
-            ('DE', 'DE'),
-            ('DC', 'DC'),
-            ('FL', 'FL'),
-            ('GA', 'GA'),
-            ('HI', 'HI'),
-            ('ID', 'ID'),
-            ('IL', 'IL'),
-            ('IN', 'IN'),
-            ('IA', 'IA'),
-            ('KS', 'KS'),
-            ('KY', 'KY'),
-            ('LA', 'LA'),
-            ('ME', 'ME'),
-            ('MT', 'MT'),
-            ('NE', 'NE'),
-            ('NV', 'NV'),
-            ('NH', 'NH'),
-            ('NJ', 'NJ'),
-            ('NM', 'NM'),
-            ('NY', 'NY'),
-            ('NC', 'NC'),
-            ('ND', 'ND'),
-            ('OH', 'OH'),
-            ('OK', 'OK'),
-            ('OR', 'OR'),
-            ('MD', 'MD'),
-            ('MA', 'MA'),
-            ('MI', 'MI'),
-            ('MN', 'MN'),
-            ('MS', 'MS'),
-            ('MO', 'MO'),
-            ('PA', 'PA'),
-            ('RI', 'RI'),
-            ('SC', 'SC'),
-            ('SD', 'SD'),
-            ('TN', 'TN'),
-            ('TX', 'TX'),
-            ('UT', 'UT'),
-            ('VT', 'VT'),
-            ('VA', 'VA'),
-            ('WA', 'WA'),
-            ('WV', 'WV'),
-            ('WI', 'WI'),
-            ('WY', 'WY'),
-        ]
+        'state', validators=[DataRequired(), InChoices(STATE_VALUES)],
+        choices=STATE_CHOICES, validate_choice=False
     )
     phone = StringField(
         # COMPLETED implement validation logic for phone
@@ -201,31 +194,10 @@ class ArtistForm(Form):
         'image_link'
     )
     genres = SelectMultipleField(
-        'genres', validators=[DataRequired()],
-        choices=[
-            ('Alternative', 'Alternative'),
-            ('Blues', 'Blues'),
-            ('Classical', 'Classical'),
-            ('Country', 'Country'),
-            ('Electronic', 'Electronic'),
-            ('Folk', 'Folk'),
-            ('Funk', 'Funk'),
-            ('Hip-Hop', 'Hip-Hop'),
-            ('Heavy Metal', 'Heavy Metal'),
-            ('Instrumental', 'Instrumental'),
-            ('Jazz', 'Jazz'),
-            ('Musical Theatre', 'Musical Theatre'),
-            ('Pop', 'Pop'),
-            ('Punk', 'Punk'),
-            ('R&B', 'R&B'),
-            ('Reggae', 'Reggae'),
-            ('Rock n Roll', 'Rock n Roll'),
-            ('Soul', 'Soul'),
-            ('Other', 'Other'),
-        ]
+        'genres', validators=[DataRequired(), InChoices(GENRE_VALUES)],
+        choices=GENRE_CHOICES, validate_choice=False
      )
     facebook_link = StringField(
-        # TODO implement enum restriction
         'facebook_link', validators=[Optional(), URL()]
      )
 
@@ -238,4 +210,3 @@ class ArtistForm(Form):
     seeking_description = StringField(
             'seeking_description'
      )
-
@@ -0,0 +1,162 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import heapq
+import math
+import threading
+
+from models import db, Venue
+from serializers import summary
+from versions import read_versions
+
+
+EARTH_RADIUS_MILES = 3958.8
+
+# farthest two points on the globe can be
+MAX_MILES = math.pi * EARTH_RADIUS_MILES
+
+
+#----------------------------------------------------------------------------#
+# Distances.
+#----------------------------------------------------------------------------#
+
+# Points are kept as unit vectors, so the tree below can use plain euclidean
+# distances: the straight-line (chord) distance between two points on the
+# sphere grows with their great-circle distance, and converts to miles exactly.
+
+def unit_vector(latitude, longitude):
+    latitude, longitude = math.radians(latitude), math.radians(longitude)
+    return (math.cos(latitude) * math.cos(longitude),
+            math.cos(latitude) * math.sin(longitude),
+            math.sin(latitude))
+
+
+def chord_length(miles):
+    return 2 * math.sin(min(miles, MAX_MILES) / EARTH_RADIUS_MILES / 2)
+
+
+def chord_miles(chord):
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(chord / 2, 1.0))
+
+
+#----------------------------------------------------------------------------#
+# KD-tree.
+#----------------------------------------------------------------------------#
+
+class KDTree:
+    # A static 3-d tree over (point, id) pairs, each node splitting its
+    # subtree on x, y or z in turn at the median. Nearest-neighbour queries
+    # skip any subtree farther from the query point than the current worst
+    # match, so they visit O(log n) nodes for the small k we ask for.
+
+    def __init__(self, items):
+        self.root = self._build(list(items), 0)
+
+    def _build(self, items, axis):
+        if not items:
+            return None
+        items.sort(key=lambda item: item[0][axis])
+        middle = len(items) // 2
+        point, item_id = items[middle]
+        next_axis = (axis + 1) % 3
+        return (point, item_id, axis,
+                self._build(items[:middle], next_axis),
+                self._build(items[middle + 1:], next_axis))
+
+    def nearest(self, point, k, max_distance):
+        # up to k (distance, id) pairs within max_distance of point, nearest
+        # first
+        if k <= 0:
+            return []
+        found = []  # max-heap of (-squared distance, id)
+        worst = max_distance * max_distance
+        stack = [(self.root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            # bound: squared distance from point to the region of node
+            if node is None or bound > worst:
+                continue
+            node_point, node_id, axis, left, right = node
+            squared = ((node_point[0] - point[0]) ** 2 + (node_point[1] - point[1]) ** 2
+                       + (node_point[2] - point[2]) ** 2)
+            if squared <= worst:
+                heapq.heappush(found, (-squared, node_id))
+                if len(found) > k:
+                    heapq.heappop(found)
+                if len(found) == k:
+                    worst = -found[0][0]
+
+            offset = point[axis] - node_point[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            # the near side is searched first; by the time the far side is
+            # popped `worst` may have shrunk enough to skip it
+            stack.append((far, max(bound, offset * offset)))
+            stack.append((near, bound))
+
+        return sorted((math.sqrt(-squared), item_id) for squared, item_id in found)
+
+
+#----------------------------------------------------------------------------#
+# Venue index.
+#----------------------------------------------------------------------------#
+
+# Built from the geocoded venues on first use. Each lookup reads the
+# venue-records version (a primary key lookup) and rebuilds the tree when a
+# venue has been added, edited or deleted since, by this worker or any other
+# (including `flask data geocode`). Show bookings and the show counter
+# refreshes leave that version alone, so they don't trigger rebuilds.
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _get_index():
+    global _index
+    latest = read_versions(['venue-records'])['venue-records']
+    index = _index
+    if index is None or index[0] != latest:
+        with _index_lock:
+            index = _index
+            if index is None or index[0] != latest:
+                rows = (db.session.query(Venue.id, Venue.latitude, Venue.longitude)
+                        .filter(Venue.latitude.isnot(None), Venue.longitude.isnot(None))
+                        .all())
+                tree = KDTree([(unit_vector(latitude, longitude), venue_id)
+                               for venue_id, latitude, longitude in rows])
+                index = _index = (latest, tree)
+    return index[1]
+
+
+def venues_near(latitude, longitude, miles, limit, upcoming=False):
+    # The `limit` venues nearest to (latitude, longitude) and within `miles`
+    # of it, nearest first, optionally only those with upcoming shows. Each
+    # carries its city, state, upcoming show count and distance in miles.
+    tree = _get_index()
+    point = unit_vector(latitude, longitude)
+    max_distance = chord_length(miles)
+
+    k = limit
+    while True:
+        candidates = tree.nearest(point, k, max_distance)
+        query = (db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                                  Venue.upcoming_shows_count.label('num_upcoming_shows'))
+                 .filter(Venue.id.in_(db.bindparam('venue_ids', [venue_id for _, venue_id in candidates],
+                                                   expanding=True, literal_execute=True))))
+        if upcoming:
+            query = query.filter(Venue.upcoming_shows_count > 0)
+        rows = {row.id: row for row in query} if candidates else {}
+
+        # rows filtered out (or deleted since the tree was built) leave the
+        # page short: look further out until it fills up or the radius is
+        # exhausted
+        if len(rows) >= limit or len(candidates) < k:
+            break
+        k *= 4
+
+    data = []
+    for distance, venue_id in candidates:
+        row = rows.get(venue_id)
+        if row is not None:
+            data.append(dict(summary(row), city=row.city, state=row.state,
+                             distance_miles=round(chord_miles(distance), 2)))
+    return data[:limit]
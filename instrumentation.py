@@ -0,0 +1,193 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import functools
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# request latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+#----------------------------------------------------------------------------#
+# Metrics.
+#----------------------------------------------------------------------------#
+
+class Metrics:
+    # Per-process counters exposed in the Prometheus text format. Each
+    # gunicorn worker keeps its own, so scrape workers individually or
+    # aggregate by instance.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.slow_requests = defaultdict(int)
+        self.queries = defaultdict(int)
+        self.query_seconds = defaultdict(float)
+        self.latency_buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self.latency_sum = defaultdict(float)
+        self.latency_count = defaultdict(int)
+
+    def observe(self, endpoint, method, status, seconds, query_count, query_seconds, slow):
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            self.queries[endpoint] += query_count
+            self.query_seconds[endpoint] += query_seconds
+            if slow:
+                self.slow_requests[endpoint] += 1
+            buckets = self.latency_buckets[endpoint]
+            for position, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[position] += 1
+            self.latency_sum[endpoint] += seconds
+            self.latency_count[endpoint] += 1
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            family('fyyur_requests_total', 'counter', 'HTTP requests handled.')
+            for (endpoint, method, status), value in sorted(self.requests.items()):
+                lines.append(f'fyyur_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {value}')
+
+            family('fyyur_slow_requests_total', 'counter', 'Requests over the latency or query count threshold.')
+            for endpoint, value in sorted(self.slow_requests.items()):
+                lines.append(f'fyyur_slow_requests_total{{endpoint="{endpoint}"}} {value}')
+
+            family('fyyur_db_queries_total', 'counter', 'SQL statements executed while handling requests.')
+            for endpoint, value in sorted(self.queries.items()):
+                lines.append(f'fyyur_db_queries_total{{endpoint="{endpoint}"}} {value}')
+
+            family('fyyur_db_query_duration_seconds_total', 'counter', 'Time spent executing SQL statements.')
+            for endpoint, value in sorted(self.query_seconds.items()):
+                lines.append(f'fyyur_db_query_duration_seconds_total{{endpoint="{endpoint}"}} {value:.6f}')
+
+            family('fyyur_request_duration_seconds', 'histogram', 'Request latency.')
+            for endpoint, buckets in sorted(self.latency_buckets.items()):
+                for bound, value in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f'fyyur_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {value}')
+                count = self.latency_count[endpoint]
+                lines.append(f'fyyur_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {count}')
+                lines.append(f'fyyur_request_duration_seconds_sum{{endpoint="{endpoint}"}} {self.latency_sum[endpoint]:.6f}')
+                lines.append(f'fyyur_request_duration_seconds_count{{endpoint="{endpoint}"}} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+#----------------------------------------------------------------------------#
+# Profiler.
+#----------------------------------------------------------------------------#
+
+# Each request's numbers live in its WSGI environ rather than on `g`: a
+# streamed body runs after the request's app context (and its `g`) is gone,
+# under a new one that stream_with_context pushes for the same request.
+STATS_KEY = 'fyyur.query_stats'
+
+
+class RequestStats:
+    def __init__(self):
+        self.request_start = time.perf_counter()
+        self.query_count = 0
+        self.query_seconds = 0.0
+        self.slowest_query = (0.0, None)
+
+
+class QueryProfiler:
+    # Counts and times the SQL statements of each request through the engine
+    # cursor events, reports them in a Server-Timing header, logs requests
+    # over the configured thresholds and publishes totals at /metrics.
+
+    def __init__(self, app=None):
+        self.metrics = Metrics()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_queries = app.config.get('SLOW_REQUEST_QUERY_COUNT', 20)
+        self.max_seconds = app.config.get('SLOW_REQUEST_MS', 500) / 1000.0
+
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            # once per process, however many apps create_app() builds
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            event.listen(Engine, 'handle_error', self._handle_error)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.extensions['query_profiler'] = self
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        stats = request.environ.get(STATS_KEY) if has_request_context() else None
+        if stats is None:
+            return
+        stats.query_count += 1
+        stats.query_seconds += elapsed
+        if elapsed > stats.slowest_query[0]:
+            stats.slowest_query = (elapsed, statement)
+
+    def _handle_error(self, exception_context):
+        # a failed statement never reaches after_cursor_execute
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('query_start'):
+            connection.info['query_start'].pop()
+
+    def _before_request(self):
+        request.environ[STATS_KEY] = RequestStats()
+
+    def _after_request(self, response):
+        stats = request.environ.get(STATS_KEY)
+        if stats is None:
+            return response
+        # no reference to the response itself: registered on it below, that
+        # would make a cycle keeping an unclosed response (and the request's
+        # database connection) alive until the garbage collector runs
+        record = functools.partial(self._record, stats, request.endpoint or 'unmatched', request.method,
+                                   request.full_path, response.status_code)
+
+        if response.is_streamed:
+            # the body, and the queries it runs, are produced after this
+            # returns: record the request once it has been sent. Its headers
+            # have gone out by then, so it gets no Server-Timing header.
+            response.call_on_close(record)
+            return response
+
+        elapsed = record()
+        response.headers.add('Server-Timing', f'db;dur={stats.query_seconds * 1000:.1f};desc="{stats.query_count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+        return response
+
+    def _record(self, stats, endpoint, method, path, status):
+        # logs a slow request and adds it to the metrics; returns its duration
+        elapsed = time.perf_counter() - stats.request_start
+        slow = stats.query_count > self.max_queries or elapsed > self.max_seconds
+        if slow:
+            slowest_seconds, slowest_statement = stats.slowest_query
+            self.app.logger.warning(
+                'Slow request %s %s: %.1fms, %d queries taking %.1fms; slowest query %.1fms: %s',
+                method, path, elapsed * 1000, stats.query_count,
+                stats.query_seconds * 1000, slowest_seconds * 1000, slowest_statement
+            )
+
+        self.metrics.observe(endpoint, method, status, elapsed, stats.query_count, stats.query_seconds, slow)
+        return elapsed
+
+    def metrics_view(self):
+        return Response(self.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+query_profiler = QueryProfiler()
@@ -1,14 +1,83 @@
 #----------------------------------------------------------------------------#
 # Imports
 #----------------------------------------------------------------------------#
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import PrimaryKeyConstraint
+from datetime import datetime
 
-db=SQLAlchemy()
+from flask import current_app
+from sqlalchemy import PrimaryKeyConstraint, DDL
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import SQLAlchemyError
+
+from routing import RoutingSQLAlchemy
+
+# reads of GET requests go to SQLALCHEMY_REPLICA_URIS when set (see routing.py)
+db=RoutingSQLAlchemy()
+
+# name search uses pg_trgm GIN indexes (see search.py). Migrations creating
+# those indexes need op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm') first.
+db.event.listen(
+    db.metadata, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+# likewise btree_gist, for the show overlap constraints below
+db.event.listen(
+    db.metadata, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql')
+)
+
+
+class session_scope:
+    # Unit of work for write handlers:
+    #
+    #     with session_scope() as scope:
+    #         db.session.add(new_venue)
+    #     if scope.ok: ...
+    #
+    # Commits when the block succeeds. Database errors roll back, are logged
+    # and leave scope.ok False; any other exception rolls back and propagates.
+    # The session is removed at app context teardown, as for read handlers,
+    # so the connection goes back to the pool once per request.
+
+    def __init__(self):
+        self.ok = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            try:
+                db.session.commit()
+                self.ok = True
+                return False
+            except SQLAlchemyError as error:
+                exc_type, exc, traceback = type(error), error, error.__traceback__
+        db.session.rollback()
+        if issubclass(exc_type, SQLAlchemyError):
+            current_app.logger.error('Database write failed', exc_info=(exc_type, exc, traceback))
+            return True
+        return False
+
+
+# Genres are a varchar[] on Postgres, queried with .contains() / .overlap()
+# (see search.py), and a JSON list on sqlite, which has no array type; the
+# sqlite code paths filter genres in Python instead.
+GENRES_TYPE = postgresql.ARRAY(db.String).with_variant(db.JSON, 'sqlite')
+
+
+def search_indexes(tablename):
+    # trigram index over the searchable text columns, plus a GIN index on the
+    # genres array for containment/overlap lookups
+    return (
+        db.Index(f'ix_{tablename}_search_trgm', 'name', 'city', 'state', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops', 'city': 'gin_trgm_ops', 'state': 'gin_trgm_ops'}),
+        db.Index(f'ix_{tablename}_genres', 'genres', postgresql_using='gin'),
+    )
 
 
 class Venue(db.Model):
     __tablename__ = 'venue'
+    __table_args__ = search_indexes('venue')
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
@@ -17,11 +86,20 @@ class Venue(db.Model):
     address = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(GENRES_TYPE)
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(500))
+    # filled in by `flask data geocode`, for nearby venue lookups (see geo.py)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    # denormalized show counts for listings and search, maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # drives ETag / Last-Modified of the pages showing this venue (see conditional.py)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, server_default=db.func.now())
     artists = db.relationship('Artist', secondary='show', backref=db.backref('shows'), cascade='all, delete')
 
     def __repr__(self):
@@ -30,34 +108,100 @@ class Venue(db.Model):
 
 class Artist(db.Model):
     __tablename__ = 'artist'
+    __table_args__ = search_indexes('artist') + (
+        # keyset pagination order of the /artists listing
+        db.Index('ix_artist_upper_name_id', db.text('upper(name)'), 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True, nullable=False)
     name = db.Column(db.String(120), nullable=False)
     city = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String))
+    genres = db.Column(GENRES_TYPE)
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(500))
+    # denormalized show counts for listings and search, maintained by counters.py
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # drives ETag / Last-Modified of the pages showing this artist (see conditional.py)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, server_default=db.func.now())
 
     def __repr__(self):
         return f'<Artist {self.id} {self.name}>'
 
     # COMPLETED: implement any missing fields, as a database migration using Flask-Migrate
+# show length when none is given, and the longest accepted; overlap checks
+# (see conflicts.py) look back this far for shows still running
+DEFAULT_SHOW_MINUTES = 120
+MAX_SHOW_MINUTES = 24 * 60
+
+
 class Show(db.Model):
     __tablename__ = 'show'
-    # __table_args__ = (
-    #     PrimaryKeyConstraint('venue_id', 'artist_id', 'start_time'),
-    # )
+    # the composite primary key only serves lookups that lead with venue_id, so
+    # both detail pages get an index ordered by start_time
+    __table_args__ = (
+        db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+        # keyset pagination order of the /shows listing
+        db.Index('ix_show_start_time_venue_id_artist_id', 'start_time', 'venue_id', 'artist_id'),
+    )
     # all three columns form composite so an artist can have a show at a venue more than once.
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), primary_key=True)
     artist_id = db.Column( db.Integer, db.ForeignKey('artist.id'), primary_key=True)
     start_time = db.Column(db.DateTime, primary_key=True)
+    duration_minutes = db.Column(db.Integer, nullable=False, default=DEFAULT_SHOW_MINUTES,
+                                 server_default=str(DEFAULT_SHOW_MINUTES))
+    # drives ETag / Last-Modified of the pages listing this show (see conditional.py)
+    updated_at = db.Column(db.DateTime, nullable=False, index=True, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, server_default=db.func.now())
 
     def __repr__(self):
         return f'<Show {self.venue_id} {self.artist_id} {self.start_time}>'
 
 # COMPLETED Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
+
+# No venue or artist can have two shows running at once. conflicts.py rejects
+# overlaps with a message before inserting; on Postgres these constraints also
+# catch concurrent bookings. Migrations adding them need the same statements
+# through op.execute().
+SHOW_OVERLAP_CONSTRAINT = (
+    "ALTER TABLE show ADD CONSTRAINT ex_show_{column}_overlap EXCLUDE USING gist "
+    "({column} WITH =, tsrange(start_time, start_time + duration_minutes * interval '1 minute') WITH &&)"
+)
+for _column in ('venue_id', 'artist_id'):
+    db.event.listen(
+        Show.__table__, 'after_create',
+        DDL(SHOW_OVERLAP_CONSTRAINT.format(column=_column)).execute_if(dialect='postgresql')
+    )
+
+
+class CounterCheckpoint(db.Model):
+    # The time up to which denormalized counters have been brought; shows
+    # starting after it are counted as upcoming (see counters.py)
+    __tablename__ = 'counter_checkpoint'
+
+    name = db.Column(db.String(64), primary_key=True)
+    as_of = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<CounterCheckpoint {self.name} {self.as_of}>'
+
+
+class Version(db.Model):
+    # A counter per cache tag ('venue:3', 'shows', ...), bumped in the
+    # transaction of every write affecting it (see versions.py), so that each
+    # worker can tell in one query whether something it cached is stale
+    __tablename__ = 'version'
+
+    name = db.Column(db.String(120), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Version {self.name} {self.value}>'
@@ -0,0 +1,66 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from datetime import datetime
+
+from flask import abort
+
+from models import db
+
+
+#----------------------------------------------------------------------------#
+# Cursors.
+#----------------------------------------------------------------------------#
+
+CURSOR_SEPARATOR = '~'
+
+
+def encode_cursor(values):
+    # a cursor is the sort key of the last row on a page, e.g.
+    # "2035-04-01T20:00:00~1~2" for (start_time, venue_id, artist_id)
+    return CURSOR_SEPARATOR.join(
+        value.isoformat() if isinstance(value, datetime) else str(value) for value in values
+    )
+
+
+def decode_cursor(raw, types):
+    # parses a cursor back into typed values, one parser per sort column
+    # (datetime.fromisoformat, int, str...). Only the leading value may contain
+    # the separator, e.g. an artist name. Malformed cursors are a 400.
+    parts = raw.rsplit(CURSOR_SEPARATOR, len(types) - 1)
+    if len(parts) != len(types):
+        abort(400)
+    try:
+        return tuple(parse(part) for parse, part in zip(types, parts))
+    except ValueError:
+        abort(400)
+
+
+#----------------------------------------------------------------------------#
+# Keyset pages.
+#----------------------------------------------------------------------------#
+
+class KeysetPage:
+    # One page of a query ordered by `key_columns`, starting after `cursor`.
+    # Rows are fetched lazily and formatted one at a time, so a page can be
+    # streamed straight into a template. `next_cursor` is known once the rows
+    # have been iterated, which is also when a template reaches its footer.
+
+    def __init__(self, query, key_columns, cursor, per_page, formatter):
+        if cursor is not None:
+            query = query.filter(db.tuple_(*key_columns) > db.tuple_(*cursor))
+        # one extra row tells us whether there is a next page
+        self.query = query.order_by(*key_columns).limit(per_page + 1)
+        self.key_names = [column.key for column in key_columns]
+        self.per_page = per_page
+        self.formatter = formatter
+        self.next_cursor = None
+
+    def __iter__(self):
+        last_row = None
+        for position, row in enumerate(self.query.yield_per(min(self.per_page + 1, 500))):
+            if position == self.per_page:
+                self.next_cursor = encode_cursor(getattr(last_row, name) for name in self.key_names)
+                break
+            last_row = row
+            yield self.formatter(row)
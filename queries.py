@@ -0,0 +1,186 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+
+from cache import response_cache
+from models import db, Venue, Artist, Show
+from search import genre_filter
+from serializers import (venue_serializer, artist_serializer, venue_show_serializer,
+                         artist_show_serializer, show_serializer, summary)
+from versions import read_versions
+
+
+# Read queries shared by the HTML views and the JSON API.
+
+SHOW_KEYS = ('past_shows', 'upcoming_shows', 'past_shows_count', 'upcoming_shows_count')
+
+# longest range /api/v1/shows/days answers, in days
+MAX_CALENDAR_DAYS = 366
+
+# the dates a calendar may be asked for: a month view also reaches into the
+# weeks and months either side of it, which must still be valid dates
+FIRST_CALENDAR_DATE = date(1, 2, 1)
+LAST_CALENDAR_DATE = date(9999, 11, 30)
+
+
+def parse_detail_fields(serializer, raw):
+    # ?fields= for a detail record: serializer fields plus the show lists.
+    # Returns (record fields, show keys); raises ValueError on unknown names.
+    if not raw:
+        return list(serializer.fields), list(SHOW_KEYS)
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    record_names = [name for name in names if name not in SHOW_KEYS]
+    if record_names:
+        record_names = serializer.parse_fields(','.join(record_names))
+    return record_names or ['id'], [name for name in names if name in SHOW_KEYS]
+
+
+def parse_time_range(args):
+    # ?from= and ?to= -> (start, end) bounds on show start times, either of
+    # them None when not given. Each is a date (YYYY-MM-DD) or an ISO
+    # datetime, with or without an offset; a `to` date includes that whole
+    # day. Raises ValueError.
+    def parse(name, whole_day):
+        value = args.get(name)
+        if not value:
+            return None
+        try:
+            try:
+                day = date.fromisoformat(value)
+            except ValueError:
+                value = datetime.fromisoformat(value)
+                if value.tzinfo is not None:
+                    # show start times are naive local times (see scheduling.py)
+                    value = value.astimezone().replace(tzinfo=None)
+                return value
+            return datetime.combine(day + timedelta(days=1 if whole_day else 0), time.min)
+        except OverflowError:
+            raise ValueError(f'{name} is out of range')
+
+    start, end = parse('from', False), parse('to', True)
+    if start is not None and end is not None and end < start:
+        raise ValueError('to is before from')
+    return start, end
+
+
+def time_range_filter(start, end):
+    # start <= Show.start_time < end, as a range scan on the start_time index
+    conditions = []
+    if start is not None:
+        conditions.append(Show.start_time >= start)
+    if end is not None:
+        conditions.append(Show.start_time < end)
+    return conditions
+
+
+def split_shows(rows, serializer, now):
+    # one reference time, so no show can land in neither or both lists
+    past_shows = []
+    upcoming_shows = []
+    for row in rows:
+        show = serializer.dump(row)
+        if row.start_time < now:
+            past_shows.append(show)
+        else:
+            upcoming_shows.append(show)
+    return {
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows),
+    }
+
+
+def _detail(model, serializer, entity_id, show_serializer, show_fk, join_model, join_fk,
+            names=None, show_keys=SHOW_KEYS, start=None, end=None):
+    # one query for the record, one join query for all of its shows (those
+    # starting between start and end, when given)
+    record = db.session.query(*serializer.select(names)).filter(model.id == entity_id).first()
+    if record is None:
+        return None
+
+    data = serializer.dump(record, names)
+    if show_keys:
+        rows = (db.session.query(*show_serializer.select())
+                .join(join_model, join_fk == join_model.id)
+                .filter(show_fk == entity_id, *time_range_filter(start, end))
+                .order_by(Show.start_time)
+                .all())
+        shows = split_shows(rows, show_serializer, datetime.now())
+        data.update((key, shows[key]) for key in show_keys)
+    return data
+
+
+def venue_detail(venue_id, names=None, show_keys=SHOW_KEYS, start=None, end=None):
+    return _detail(Venue, venue_serializer, venue_id, venue_show_serializer,
+                   Show.venue_id, Artist, Show.artist_id, names, show_keys, start, end)
+
+
+def artist_detail(artist_id, names=None, show_keys=SHOW_KEYS, start=None, end=None):
+    return _detail(Artist, artist_serializer, artist_id, artist_show_serializer,
+                   Show.artist_id, Venue, Show.venue_id, names, show_keys, start, end)
+
+
+def venue_directory(genres=(), match='all'):
+    # every venue (listing `genres`, if given) with its upcoming show counter
+    # (see counters.py), ordered so venues sharing a city AND state are
+    # adjacent and can be grouped below
+    venue_query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                                   Venue.upcoming_shows_count.label('num_upcoming_shows'))
+    if genres:
+        venue_query = venue_query.filter(genre_filter(Venue, genres, match))
+    venue_rows = venue_query.order_by(Venue.city, Venue.state, Venue.name).all()
+
+    return [{"city": city, "state": state, "venues": [summary(row) for row in city_venues]}
+            for (city, state), city_venues in groupby(venue_rows, key=lambda row: (row.city, row.state))]
+
+
+#----------------------------------------------------------------------------#
+# Calendar.
+#----------------------------------------------------------------------------#
+
+def show_day_counts(first_day, last_day):
+    # {date: number of shows starting that day} for first_day..last_day.
+    # Each day's count is cached on its own and evicted when a show on that
+    # day is added or removed, so paging through months or weeks only
+    # queries the days not cached yet: one grouped range scan over them.
+    days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+    cached = response_cache.get_many(f'shows-day:{day.isoformat()}' for day in days)
+    counts = {}
+    missing = []
+    for day in days:
+        count = cached.get(f'shows-day:{day.isoformat()}')
+        if count is None:
+            missing.append(day)
+        else:
+            counts[day] = count
+
+    if missing:
+        versions = read_versions(f'shows-day:{day.isoformat()}' for day in missing) \
+            if response_cache.enabled else {}
+        start = datetime.combine(missing[0], time.min)
+        end = datetime.combine(missing[-1] + timedelta(days=1), time.min)
+        day_column = db.func.date(Show.start_time)
+        found = {}
+        for day, count in (db.session.query(day_column, db.func.count())
+                           .filter(*time_range_filter(start, end))
+                           .group_by(day_column)):
+            # a date on Postgres, an ISO string on sqlite
+            found[day if isinstance(day, date) else date.fromisoformat(day)] = count
+        for day in missing:
+            counts[day] = found.get(day, 0)
+            tag = f'shows-day:{day.isoformat()}'
+            response_cache.set(tag, counts[day], {tag: versions.get(tag, 0)})
+    return counts
+
+
+def shows_between(start, end):
+    # the shows starting in [start, end), earliest first, as on /shows
+    return [show_serializer.dump(row) for row in
+            (db.session.query(*show_serializer.select())
+             .join(Venue, Venue.id == Show.venue_id)
+             .join(Artist, Artist.id == Show.artist_id)
+             .filter(*time_range_filter(start, end))
+             .order_by(Show.start_time, Show.venue_id, Show.artist_id))]
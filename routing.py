@@ -0,0 +1,152 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import itertools
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import create_engine, event, orm
+
+
+# requests with these methods may read from a replica
+READ_METHODS = ('GET', 'HEAD')
+
+# flask session key holding the time until which reads stay on the primary
+PIN_KEY = '_primary_until'
+
+# weight of the newest sample in a replica's average statement latency
+LATENCY_WEIGHT = 0.2
+
+
+def pinned_to_primary():
+    # whether this user's reads stay on the primary after a recent write
+    return session.get(PIN_KEY, 0) > time.time()
+
+
+#----------------------------------------------------------------------------#
+# Replicas.
+#----------------------------------------------------------------------------#
+
+class ReplicaSet:
+    # The read replicas of one app. 'round_robin' hands them out in turn,
+    # 'least_latency' picks the one whose recent statements ran fastest.
+    # A replica that drops its connection is skipped for retry_seconds;
+    # with none available, reads fall back to the primary.
+
+    def __init__(self, uris, strategy='round_robin', engine_options=None, retry_seconds=30,
+                 pin_seconds=300):
+        if strategy not in ('round_robin', 'least_latency'):
+            raise ValueError(f'unknown replica strategy: {strategy}')
+        self.strategy = strategy
+        self.retry_seconds = retry_seconds
+        self.pin_seconds = pin_seconds
+        self.engines = [create_engine(uri, **(engine_options or {})) for uri in uris]
+        self.latency = {engine: 0.0 for engine in self.engines}
+        self.down_until = {engine: 0.0 for engine in self.engines}
+        self._turns = itertools.cycle(self.engines)
+        self._lock = threading.Lock()
+
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+            event.listen(engine, 'handle_error', self._handle_error)
+
+    def choose(self):
+        now = time.monotonic()
+        with self._lock:
+            available = [engine for engine in self.engines if self.down_until[engine] <= now]
+            if not available:
+                return None
+            if self.strategy == 'least_latency':
+                return min(available, key=self.latency.__getitem__)
+            for engine in self._turns:
+                if engine in available:
+                    return engine
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('replica_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['replica_query_start'].pop()
+        with self._lock:
+            average = self.latency[conn.engine]
+            self.latency[conn.engine] = elapsed if not average else (
+                LATENCY_WEIGHT * elapsed + (1 - LATENCY_WEIGHT) * average)
+
+    def _handle_error(self, exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get('replica_query_start'):
+            connection.info['replica_query_start'].pop()
+        if exception_context.is_disconnect:
+            with self._lock:
+                self.down_until[exception_context.engine] = time.monotonic() + self.retry_seconds
+
+
+#----------------------------------------------------------------------------#
+# Session.
+#----------------------------------------------------------------------------#
+
+class RoutingSession(SignallingSession):
+    # Sends the statements of read-only requests to a replica (the same one
+    # for the whole request). Flushes, requests that are not GET/HEAD, and
+    # anything outside a request (CLI commands, migrations) use the primary.
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and has_request_context():
+            replica = g.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    # Flask-SQLAlchemy with read replicas, configured by
+    # SQLALCHEMY_REPLICA_URIS. Without replicas it behaves as SQLAlchemy.
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def init_app(self, app):
+        super().init_app(app)
+        uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        if not uris:
+            return
+        app.extensions['replicas'] = ReplicaSet(
+            uris,
+            strategy=app.config.get('REPLICA_STRATEGY', 'round_robin'),
+            engine_options=app.config.get('SQLALCHEMY_ENGINE_OPTIONS'),
+            retry_seconds=app.config.get('REPLICA_RETRY_SECONDS', 30),
+            pin_seconds=app.config.get('REPLICA_PIN_SECONDS', 300),
+        )
+        app.before_request(self._route_request)
+        if not event.contains(self.session, 'after_commit', self._pin_to_primary):
+            event.listen(self.session, 'after_flush', self._note_write)
+            event.listen(self.session, 'do_orm_execute', self._note_statement)
+            event.listen(self.session, 'after_commit', self._pin_to_primary)
+            event.listen(self.session, 'after_rollback', self._forget_write)
+
+    def _route_request(self):
+        # read-your-writes: after a write, this user's reads stay on the
+        # primary until replication has had time to catch up
+        if request.method in READ_METHODS and not pinned_to_primary():
+            g.replica = current_app.extensions['replicas'].choose()
+
+    def _note_write(self, flushed_session, flush_context):
+        flushed_session.info['wrote'] = True
+
+    def _note_statement(self, orm_execute_state):
+        # INSERT/UPDATE/DELETE statements run through session.execute()
+        if not orm_execute_state.is_select:
+            orm_execute_state.session.info['wrote'] = True
+
+    def _pin_to_primary(self, committed_session):
+        if committed_session.info.pop('wrote', False) and has_request_context():
+            replicas = current_app.extensions.get('replicas')
+            if replicas is not None:
+                session[PIN_KEY] = time.time() + replicas.pin_seconds
+            g.pop('replica', None)
+
+    def _forget_write(self, rolled_back_session):
+        rolled_back_session.info.pop('wrote', None)
@@ -0,0 +1,176 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from datetime import datetime
+from itertools import islice
+
+from cache import collect_tags
+from conflicts import check_start_time, find_conflicts
+from counters import adjust_show_counters
+from models import db, session_scope, Venue, Artist, Show, DEFAULT_SHOW_MINUTES, MAX_SHOW_MINUTES
+
+
+# most shows one request may schedule, recurrences included
+MAX_SCHEDULED_SHOWS = 500
+
+# rows per multi-row INSERT, well under SQLite's and Postgres' bind
+# parameter limits
+INSERT_CHUNK_SIZE = 200
+
+MODES = ('atomic', 'best_effort')
+
+
+#----------------------------------------------------------------------------#
+# Parsing.
+#----------------------------------------------------------------------------#
+
+def _parse_time(value):
+    if not isinstance(value, datetime):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    if value.tzinfo is not None:
+        # start times are stored as naive local times
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def _occurrences(start_time, rule):
+    # an RFC 5545 recurrence, e.g. 'FREQ=WEEKLY;COUNT=8', starting at start_time
+    from dateutil.rrule import rrulestr
+
+    times = list(islice(rrulestr(rule, dtstart=start_time), MAX_SCHEDULED_SHOWS + 1))
+    if len(times) > MAX_SCHEDULED_SHOWS:
+        raise ValueError(f'recurrence has more than {MAX_SCHEDULED_SHOWS} dates; give it a COUNT or UNTIL')
+    return times
+
+
+def _parse_duration(value):
+    minutes = int(value)
+    if not 0 < minutes <= MAX_SHOW_MINUTES:
+        raise ValueError(f'duration_minutes must be between 1 and {MAX_SHOW_MINUTES}')
+    return minutes
+
+
+def expand(items):
+    # Turns request items ({venue_id, artist_id, start_time[, duration_minutes]
+    # [, rrule]}) into one result dict per show. Items that cannot be parsed
+    # come back as errors.
+    results = []
+    for position, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('not an object')
+            venue_id = int(item['venue_id'])
+            artist_id = int(item['artist_id'])
+            start_time = _parse_time(item['start_time'])
+            duration_minutes = _parse_duration(item.get('duration_minutes') or DEFAULT_SHOW_MINUTES)
+            rule = item.get('rrule')
+            if rule is not None and not isinstance(rule, str):
+                raise ValueError('rrule is not a string')
+            times = _occurrences(start_time, rule) if rule else [start_time]
+            for occurrence in times:
+                check_start_time(occurrence)
+        except KeyError as error:
+            results.append({"item": position, "status": "error", "error": f'missing {error.args[0]}'})
+            continue
+        except (TypeError, ValueError, OverflowError) as error:
+            results.append({"item": position, "status": "error", "error": str(error)})
+            continue
+
+        for start_time in times:
+            results.append({"item": position, "venue_id": venue_id, "artist_id": artist_id,
+                            "start_time": start_time, "duration_minutes": duration_minutes,
+                            "status": "pending"})
+    return results
+
+
+#----------------------------------------------------------------------------#
+# Scheduling.
+#----------------------------------------------------------------------------#
+
+def _reject(result, message):
+    result["status"] = "error"
+    result["error"] = message
+
+
+def _validate(results):
+    # one existence query per referenced model and one for composite key
+    # collisions, however many shows are scheduled
+    pending = [result for result in results if result["status"] == "pending"]
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+        ids = {result[key] for result in pending}
+        known = {entity_id for entity_id, in db.session.query(model.id).filter(model.id.in_(ids))} if ids else set()
+        for result in pending:
+            if result[key] not in known:
+                _reject(result, f'no {model.__tablename__} with id {result[key]}')
+
+    pending = [result for result in pending if result["status"] == "pending"]
+    keys = [(result["venue_id"], result["artist_id"], result["start_time"]) for result in pending]
+    existing = set()
+    if keys:
+        existing = set(db.session.query(Show.venue_id, Show.artist_id, Show.start_time)
+                       .filter(db.tuple_(Show.venue_id, Show.artist_id, Show.start_time).in_(keys))
+                       .all())
+
+    seen = set()
+    for result, key in zip(pending, keys):
+        if key in existing:
+            _reject(result, 'this artist already has a show at this venue at that time')
+        elif key in seen:
+            _reject(result, 'listed more than once')
+        else:
+            seen.add(key)
+
+    # overlaps with booked shows, and with the batch's earlier shows
+    pending = [result for result in pending if result["status"] == "pending"]
+    conflicts = find_conflicts([(result["venue_id"], result["artist_id"], result["start_time"],
+                                 result["duration_minutes"]) for result in pending])
+    for result, conflict in zip(pending, conflicts):
+        if conflict is not None:
+            _reject(result, conflict)
+
+
+def schedule_shows(items, mode='atomic'):
+    # Validates and inserts many shows at once. 'atomic' inserts nothing if
+    # any show is invalid; 'best_effort' inserts the valid ones. Returns
+    # (created count, per-show results, each with a status of 'created',
+    # 'error' or, in atomic mode, 'skipped').
+    if mode not in MODES:
+        raise ValueError('mode must be one of: ' + ', '.join(MODES))
+    if not items:
+        raise ValueError('no shows given')
+    results = expand(items)
+    if len(results) > MAX_SCHEDULED_SHOWS:
+        raise ValueError(f'at most {MAX_SCHEDULED_SHOWS} shows can be scheduled at once')
+    _validate(results)
+
+    pending = [result for result in results if result["status"] == "pending"]
+    if mode == 'atomic' and len(pending) < len(results):
+        for result in pending:
+            result["status"] = "skipped"
+        return 0, results
+    if not pending:
+        return 0, results
+
+    shows = [Show(venue_id=result["venue_id"], artist_id=result["artist_id"], start_time=result["start_time"],
+                  duration_minutes=result["duration_minutes"])
+             for result in pending]
+    with session_scope() as scope:
+        # multi-row INSERTs skip the mapper events, so the show counters
+        # and response cache tags are updated here, for all rows at once
+        now = datetime.utcnow()
+        for start in range(0, len(shows), INSERT_CHUNK_SIZE):
+            chunk = shows[start:start + INSERT_CHUNK_SIZE]
+            db.session.execute(Show.__table__.insert().values([
+                {"venue_id": show.venue_id, "artist_id": show.artist_id, "start_time": show.start_time,
+                 "duration_minutes": show.duration_minutes, "updated_at": now} for show in chunk
+            ]))
+        adjust_show_counters(db.session.connection(), shows, 1)
+        collect_tags(db.session, shows)
+
+    for result in pending:
+        if scope.ok:
+            result["status"] = "created"
+        else:
+            _reject(result, 'could not be saved, please try again')
+    return (len(pending) if scope.ok else 0), results
@@ -0,0 +1,279 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import bisect
+import threading
+from collections import defaultdict
+
+from models import db
+from serializers import summary
+from versions import read_versions
+
+
+#----------------------------------------------------------------------------#
+# Search entry point.
+#----------------------------------------------------------------------------#
+
+# most records one search returns, when no smaller limit is asked for
+SEARCH_MAX_LIMIT = 500
+
+
+def search_with_upcoming_shows(model, search_term, limit=None, offset=0, genres=(), match='all'):
+    # Returns (count, data) for records of `model` whose name, city, state or
+    # genres match search_term, best matches first. Each record carries its
+    # number of upcoming shows, read from its counter (see counters.py).
+    # On Postgres the match runs against pg_trgm GIN indexes (see models.py),
+    # so a leading-wildcard term no longer forces a sequential scan. Other
+    # databases (sqlite for local testing) use an in-process n-gram index.
+    # `genres` narrows the results, see genre_filter below. `limit` and
+    # `offset` come straight from the query string: negative values would be
+    # an error on Postgres and count from the end of the list elsewhere.
+    limit = SEARCH_MAX_LIMIT if limit is None else min(max(limit, 0), SEARCH_MAX_LIMIT)
+    offset = max(offset or 0, 0)
+    if db.engine.dialect.name == 'postgresql':
+        return _trigram_search(model, search_term, limit, offset, genres, match)
+    return _ngram_search(model, search_term, limit, offset, genres, match)
+
+
+def _genre_variants(search_term):
+    # genres are stored with their display casing ('Jazz', 'Hip-Hop', 'R&B')
+    return list({search_term, search_term.capitalize(), search_term.title(), search_term.upper()})
+
+
+def _trigram_search(model, search_term, limit, offset, genres, match):
+    # Matches, ranking, upcoming show counts and the total number of matches
+    # all come from one query; only an empty page needs a second one for the
+    # total.
+    pattern = '%' + search_term + '%'
+    rank = db.func.greatest(db.func.similarity(model.name, search_term),
+                            db.func.similarity(model.city, search_term))
+
+    query = (db.session.query(model.id, model.name,
+                              model.upcoming_shows_count.label('num_upcoming_shows'),
+                              db.func.count().over().label('total'))
+             .filter(db.or_(model.name.ilike(pattern),
+                            model.name.op('%')(search_term),
+                            model.city.ilike(pattern),
+                            model.state.ilike(search_term),
+                            model.genres.overlap(_genre_variants(search_term))))
+             .order_by(rank.desc(), model.name, model.id))
+    if genres:
+        query = query.filter(genre_filter(model, genres, match))
+
+    query = query.limit(limit)
+    if offset:
+        query = query.offset(offset)
+
+    rows = query.all()
+    if rows:
+        count = rows[0].total
+    elif offset or not limit:
+        # an empty page, or one past the last match, has no row to carry the
+        # total
+        count = query.limit(None).offset(None).order_by(None).with_entities(db.func.count()).scalar()
+    else:
+        count = 0
+
+    data = [summary(row) for row in rows]
+
+    return count, data
+
+
+def _ngram_search(model, search_term, limit, offset, genres, match):
+    # Ranks matches from the in-process index, then reads the upcoming show
+    # counters of the requested page only, in one primary key lookup.
+    matches = _get_index(model).search(search_term)
+    if genres:
+        wanted = _get_index(model, GenreIndex).matching(genres, match)
+        matches = [(doc_id, name) for doc_id, name in matches if doc_id in wanted]
+    count = len(matches)
+
+    page = matches[offset:offset + limit]
+
+    ids = [doc_id for doc_id, name in page]
+    show_counts = {}
+    if ids:
+        show_counts = dict(db.session.query(model.id, model.upcoming_shows_count)
+                           .filter(model.id.in_(ids))
+                           .all())
+
+    data = [{"id": doc_id, "name": name, "num_upcoming_shows": show_counts.get(doc_id, 0)}
+            for doc_id, name in page]
+
+    return count, data
+
+
+#----------------------------------------------------------------------------#
+# Genre filters.
+#----------------------------------------------------------------------------#
+
+def genre_filter(model, genres, match='all'):
+    # A filter clause for records of `model` listing every one of `genres`
+    # (match='all') or at least one (match='any'). On Postgres that is `@>`
+    # or `&&` on the genres array, answered from its GIN index (see
+    # models.py). Other databases have no array operators, so the ids come
+    # from an in-process inverted index and are inlined into an IN list.
+    if db.engine.dialect.name == 'postgresql':
+        return model.genres.contains(genres) if match == 'all' else model.genres.overlap(genres)
+    ids = _get_index(model, GenreIndex).matching(genres, match)
+    return model.id.in_(db.bindparam('genre_ids', sorted(ids), unique=True, expanding=True,
+                                     literal_execute=True))
+
+
+class GenreIndex:
+    # genre -> ids of the records listing it
+
+    def __init__(self, rows):
+        self.ids = defaultdict(set)
+        for doc_id, name, city, state, genres in rows:
+            for genre in genres or ():
+                self.ids[genre].add(doc_id)
+
+    def matching(self, genres, match='all'):
+        # intersections start from the rarest genre
+        posting_lists = sorted((self.ids.get(genre, set()) for genre in genres), key=len)
+        if not posting_lists:
+            return set()
+        if match == 'any':
+            return set().union(*posting_lists)
+        return set.intersection(*posting_lists)
+
+
+#----------------------------------------------------------------------------#
+# In-process n-gram index.
+#----------------------------------------------------------------------------#
+
+def _trigrams(text, padded=True):
+    # pg_trgm style trigrams: lower-cased words padded with two leading spaces
+    # and one trailing space. Unpadded trigrams are used to look up substrings.
+    grams = set()
+    for word in text.lower().split():
+        if padded:
+            word = '  ' + word + ' '
+        for i in range(len(word) - 2):
+            grams.add(word[i:i + 3])
+    return grams
+
+
+class NgramIndex:
+    # Trigram posting lists over the name, city, state and genres of one model.
+    # Candidates are found through the posting lists and ranked by trigram
+    # similarity, so lookups cost roughly the same however large the catalog.
+
+    def __init__(self, rows):
+        self.names = {}
+        self.texts = {}
+        self.name_grams = {}
+        self.postings = defaultdict(set)
+
+        for doc_id, name, city, state, genres in rows:
+            fields = [name or '', city or '', state or ''] + list(genres or [])
+            text = ' '.join(fields).lower()
+            self.names[doc_id] = name
+            self.texts[doc_id] = text
+            self.name_grams[doc_id] = _trigrams(name or '')
+            for gram in _trigrams(text, padded=False) | _trigrams(text):
+                self.postings[gram].add(doc_id)
+
+    def similarity(self, doc_id, term_grams):
+        name_grams = self.name_grams[doc_id]
+        if not name_grams or not term_grams:
+            return 0.0
+        return len(name_grams & term_grams) / len(name_grams | term_grams)
+
+    def search(self, search_term, threshold=0.3):
+        term = search_term.lower().strip()
+        if not term:
+            candidates = set(self.names)
+        else:
+            substring_grams = _trigrams(term, padded=False)
+            if len(term.replace(' ', '')) < 3 or not substring_grams:
+                # too short to have trigrams of its own: check every document
+                candidates = set(self.names)
+            else:
+                posting_lists = sorted((self.postings.get(gram, set()) for gram in substring_grams), key=len)
+                candidates = set.intersection(*posting_lists)
+            # fuzzy candidates: anything sharing a trigram with the term's words
+            for gram in _trigrams(term):
+                candidates |= self.postings.get(gram, set())
+
+        term_grams = _trigrams(term)
+        ranked = []
+        for doc_id in candidates:
+            score = self.similarity(doc_id, term_grams)
+            if term in self.texts[doc_id] or score >= threshold:
+                ranked.append((-score, self.names[doc_id], doc_id))
+        ranked.sort()
+
+        return [(doc_id, name) for score, name, doc_id in ranked]
+
+
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#----------------------------------------------------------------------------#
+
+class PrefixIndex:
+    # Sorted (key, name, id) entries with one key per word of each name, from
+    # that word to the end ('the wild sax band', 'wild sax band', 'sax band',
+    # 'band'), so a bisect finds names starting with the term or having a
+    # word that does.
+
+    def __init__(self, rows):
+        entries = []
+        for doc_id, name, *_ in rows:
+            words = (name or '').lower().split()
+            for position in range(len(words)):
+                entries.append((' '.join(words[position:]), name, doc_id))
+        entries.sort()
+        self.keys = [key for key, name, doc_id in entries]
+        self.entries = entries
+
+    def complete(self, term, limit):
+        term = ' '.join(term.lower().split())
+        if not term:
+            return []
+        matches = []
+        seen = set()
+        position = bisect.bisect_left(self.keys, term)
+        while position < len(self.entries) and len(matches) < limit:
+            key, name, doc_id = self.entries[position]
+            if not key.startswith(term):
+                break
+            position += 1
+            if doc_id not in seen:
+                seen.add(doc_id)
+                matches.append({"id": doc_id, "name": name})
+        return matches
+
+
+def autocomplete(model, term, limit=10):
+    # up to `limit` records of `model` with a name, or a word in it, starting
+    # with term; answered from memory, after the index's version check
+    return _get_index(model, PrefixIndex).complete(term, limit)
+
+
+#----------------------------------------------------------------------------#
+# Index cache.
+#----------------------------------------------------------------------------#
+
+# Each index is built from the rows it covers on first use, and rebuilt once
+# their version ('venue-records' / 'artist-records', bumped by any write to
+# the rows themselves in any process, see versions.py) has moved on. Checking
+# costs one primary key lookup per search.
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _get_index(model, index_class=NgramIndex):
+    key = (index_class, model)
+    name = f'{model.__tablename__}-records'
+    version = read_versions([name])[name]
+    built = _indexes.get(key)
+    if built is None or built[0] != version:
+        with _indexes_lock:
+            built = _indexes.get(key)
+            if built is None or built[0] != version:
+                rows = db.session.query(model.id, model.name, model.city, model.state, model.genres).all()
+                built = _indexes[key] = (version, index_class(rows))
+    return built[1]
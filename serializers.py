@@ -0,0 +1,94 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import json
+from datetime import date
+
+from models import Venue, Artist, Show
+
+
+#----------------------------------------------------------------------------#
+# Serializers.
+#----------------------------------------------------------------------------#
+
+class Serializer:
+    # Maps output field names to the columns they are read from. Queries
+    # select only the labelled columns for the fields asked for, and rows
+    # (or model instances) are dumped into the dicts the templates and the
+    # JSON API share.
+
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def parse_fields(self, raw):
+        # "id,name" -> ['id', 'name']; None/empty means every field
+        if not raw:
+            return list(self.fields)
+        names = [name.strip() for name in raw.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError('unknown fields: ' + ', '.join(unknown))
+        return names
+
+    def select(self, names=None):
+        return [self.fields[name].label(name) for name in (names or self.fields)]
+
+    def dump(self, row, names=None):
+        if names is None:
+            names = self.fields
+        if hasattr(row, '__table__'):
+            # a model instance: read the mapped attributes
+            return {name: getattr(row, self.fields[name].key) for name in names}
+        return {name: getattr(row, name) for name in names}
+
+
+venue_serializer = Serializer(
+    id=Venue.id, name=Venue.name, city=Venue.city, state=Venue.state, address=Venue.address,
+    phone=Venue.phone, image_link=Venue.image_link, genres=Venue.genres,
+    facebook_link=Venue.facebook_link, website=Venue.website_link,
+    seeking_talent=Venue.seeking_talent, seeking_description=Venue.seeking_description,
+    latitude=Venue.latitude, longitude=Venue.longitude,
+)
+
+artist_serializer = Serializer(
+    id=Artist.id, name=Artist.name, city=Artist.city, state=Artist.state, phone=Artist.phone,
+    image_link=Artist.image_link, genres=Artist.genres, facebook_link=Artist.facebook_link,
+    website=Artist.website_link, seeking_venue=Artist.seeking_venue,
+    seeking_description=Artist.seeking_description,
+)
+
+# shows as listed on a venue page, an artist page and /shows
+venue_show_serializer = Serializer(
+    artist_id=Show.artist_id, artist_name=Artist.name, artist_image_link=Artist.image_link,
+    start_time=Show.start_time,
+)
+
+artist_show_serializer = Serializer(
+    venue_id=Show.venue_id, venue_name=Venue.name, venue_image_link=Venue.image_link,
+    start_time=Show.start_time,
+)
+
+show_serializer = Serializer(
+    venue_id=Show.venue_id, venue_name=Venue.name, artist_id=Show.artist_id,
+    artist_name=Artist.name, artist_image_link=Artist.image_link, start_time=Show.start_time,
+    duration_minutes=Show.duration_minutes,
+)
+
+
+def summary(row):
+    # a venue/artist in listings and search results
+    return {"id": row.id, "name": row.name, "num_upcoming_shows": row.num_upcoming_shows}
+
+
+#----------------------------------------------------------------------------#
+# JSON.
+#----------------------------------------------------------------------------#
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def to_json(value):
+    return json.dumps(value, default=_default, separators=(',', ':'))
@@ -0,0 +1,82 @@
+#----------------------------------------------------------------------------#
+# Test setup.
+#----------------------------------------------------------------------------#
+# Every test using `app` runs against a fresh sqlite database, and against
+# Postgres too when TEST_DATABASE_URL points at a scratch database, e.g.
+#
+#     TEST_DATABASE_URL=postgresql://postgres@localhost/fyyur_test python -m pytest
+#
+# Tables are created at the start of each test and dropped at the end, so
+# don't point it at a database you care about.
+import os
+
+import pytest
+from sqlalchemy import event
+
+import config
+import geo
+import search
+from app import create_app
+from models import db
+
+
+def make_config(**overrides):
+    # the settings of config.py, adjusted for tests
+    settings = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    settings.update(
+        DEBUG=True,
+        TESTING=True,
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        SQLALCHEMY_ENGINE_OPTIONS={},
+        SQLALCHEMY_REPLICA_URIS=[],
+        CACHE_BACKEND='null',
+        TEMPLATE_CACHE_DIR='',
+    )
+    settings.update(overrides)
+    return type('TestConfig', (), settings)
+
+
+DATABASES = [
+    pytest.param('sqlite://', id='sqlite'),
+    pytest.param(os.getenv('TEST_DATABASE_URL'), id='postgresql', marks=pytest.mark.skipif(
+        not os.getenv('TEST_DATABASE_URL'), reason='TEST_DATABASE_URL is not set')),
+]
+
+
+@pytest.fixture
+def settings():
+    # overrides for make_config; tests change them before using `app`
+    return {}
+
+
+@pytest.fixture(params=DATABASES)
+def app(request, settings):
+    app = create_app(make_config(SQLALCHEMY_DATABASE_URI=request.param, **settings))
+    # in-process indexes are shared by every app in the process
+    search._indexes.clear()
+    geo._index = None
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(app):
+    # count_queries(client.get, '/venues') -> (response, SQL statements run)
+    def count(call, *args, **kwargs):
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            return call(*args, **kwargs), statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    return count
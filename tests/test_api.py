@@ -0,0 +1,62 @@
+import gzip
+
+import pytest
+
+import api
+from models import db, Venue
+
+
+@pytest.fixture
+def venues(app):
+    for number in range(3):
+        db.session.add(Venue(name=f'Venue {number}', city='San Francisco', state='CA', address='1 Main St',
+                             genres=['Jazz'], seeking_description='Looking for local jazz acts. ' * 15))
+    db.session.commit()
+
+
+def test_fields_select_the_listed_columns(client, venues):
+    response = client.get('/api/v1/venues?fields=name,city&limit=2')
+    assert response.get_json() == [{'name': 'Venue 0', 'city': 'San Francisco'},
+                                   {'name': 'Venue 1', 'city': 'San Francisco'}]
+    assert client.get('/api/v1/venues?fields=name,password').status_code == 400
+
+
+def test_page_size_is_capped(client, venues, monkeypatch):
+    monkeypatch.setattr(api, 'MAX_PAGE_SIZE', 2)
+    response = client.get('/api/v1/venues?fields=id&limit=1000')
+    assert response.get_json() == [{'id': 1}, {'id': 2}]
+    assert 'after=' in response.headers['Link']
+    # no ?limit= still streams the whole listing
+    assert len(client.get('/api/v1/venues?fields=id').get_json()) == 3
+
+
+@pytest.mark.parametrize('path, streamed', [
+    ('/api/v1/venues', True),
+    ('/api/v1/venues/1', False),
+])
+def test_gzip(client, venues, path, streamed):
+    response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+    # streamed bodies are compressed chunk by chunk, with no length up front
+    assert ('Content-Length' not in response.headers) == streamed
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == client.get(path).data
+
+
+@pytest.mark.parametrize('path, streamed', [
+    ('/api/v1/venues', True),
+    ('/api/v1/venues/1', False),
+])
+def test_brotli(client, venues, path, streamed):
+    brotli = pytest.importorskip('brotli')
+    response = client.get(path, headers={'Accept-Encoding': 'gzip, br'})
+    assert ('Content-Length' not in response.headers) == streamed
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == client.get(path).data
+
+
+def test_small_and_unaccepted_responses_are_sent_as_is(client, venues):
+    response = client.get('/api/v1/venues/1?fields=id', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json() == {'id': 1}
+    assert 'Content-Encoding' not in client.get('/api/v1/venues', headers={'Accept-Encoding': 'identity'}).headers
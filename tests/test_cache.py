@@ -0,0 +1,135 @@
+from datetime import datetime
+
+import pytest
+
+from models import db, Venue, Artist, Show, Version
+from versions import bump_versions, read_versions
+
+
+@pytest.fixture
+def settings():
+    return {'CACHE_BACKEND': 'lru'}
+
+
+@pytest.fixture
+def venue(app):
+    venue = Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1 Main St',
+                  genres=['Jazz'])
+    db.session.add(venue)
+    db.session.commit()
+    return venue
+
+
+def write_elsewhere(statement, *tags):
+    # a write committed by another worker: it bumps the versions, but this
+    # worker's cache hears nothing of it
+    with db.engine.begin() as connection:
+        connection.execute(statement)
+        bump_versions(connection, tags)
+
+
+def rename(venue_id, name):
+    return Venue.__table__.update().where(Venue.__table__.c.id == venue_id).values(name=name)
+
+
+def test_hit_checks_versions_only(client, venue, count_queries):
+    assert b'The Musical Hop' in client.get('/venues/1').data
+
+    response, statements = count_queries(client.get, '/venues/1')
+    assert b'The Musical Hop' in response.data
+    assert len(statements) == 2  # conditional GET validators, then the version check
+    assert 'version' in statements[1]
+
+
+def test_write_from_another_worker_is_not_served_stale(client, venue):
+    assert b'The Musical Hop' in client.get('/venues').data
+    assert b'The Musical Hop' in client.get('/venues/1').data
+
+    # not versioned: still served from the cache
+    write_elsewhere(rename(1, 'Unversioned Hop'))
+    assert b'The Musical Hop' in client.get('/venues').data
+
+    write_elsewhere(rename(1, 'The Musical Hop II'), 'venue:1', 'venues')
+    assert b'The Musical Hop II' in client.get('/venues').data
+    assert b'The Musical Hop II' in client.get('/venues/1').data
+
+
+def test_tags_added_by_the_view_are_versioned(client, venue):
+    db.session.add(Artist(name='Guns N Petals', city='San Francisco', state='CA', genres=['Jazz']))
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=datetime(2035, 4, 1, 20)))
+    db.session.commit()
+    assert b'Guns N Petals' in client.get('/venues/1').data
+
+    artists = Artist.__table__
+    write_elsewhere(artists.update().values(name='Guns N Roses'), 'artist-info:1')
+    assert b'Guns N Roses' in client.get('/venues/1').data
+
+
+def test_cached_day_counts_follow_versions(client, venue):
+    db.session.add(Artist(name='Guns N Petals', city='San Francisco', state='CA'))
+    db.session.commit()
+    path = '/api/v1/shows/days?from=2035-04-01&to=2035-04-02'
+    assert client.get(path).get_json() == {'2035-04-01': 0, '2035-04-02': 0}
+
+    write_elsewhere(Show.__table__.insert().values(venue_id=1, artist_id=1, start_time=datetime(2035, 4, 2, 20)),
+                    'shows-day:2035-04-02')
+    assert client.get(path).get_json() == {'2035-04-01': 0, '2035-04-02': 1}
+
+
+def test_orm_writes_bump_versions(client, venue):
+    assert b'The Musical Hop' in client.get('/venues').data
+    before = read_versions(['venue:1', 'venues'])
+    venue.name = 'The Musical Hop II'
+    db.session.commit()
+
+    assert read_versions(['venue:1', 'venues']) == {name: value + 1 for name, value in before.items()}
+
+    assert b'The Musical Hop II' in client.get('/venues').data
+
+
+def test_cascading_venue_delete_evicts_the_other_pages(client, venue):
+    db.session.add(Venue(name='Park Square', city='San Francisco', state='CA', address='2 Main St',
+                         genres=['Jazz']))
+    db.session.add_all([Artist(name='Guns N Petals', city='San Francisco', state='CA', genres=['Jazz']),
+                        Artist(name='Matt Quevedo', city='New York', state='NY', genres=['Jazz'])])
+    db.session.commit()
+    db.session.add_all([Show(venue_id=1, artist_id=1, start_time=datetime(2035, 4, 1, 20)),
+                        Show(venue_id=2, artist_id=1, start_time=datetime(2035, 4, 2, 20)),
+                        Show(venue_id=2, artist_id=2, start_time=datetime(2035, 4, 3, 20))])
+    db.session.commit()
+    assert b'Guns N Petals' in client.get('/venues/2').data
+    assert b'Guns N Petals' in client.get('/artists/1').data
+    assert b'Guns N Petals' in client.get('/artists').data
+    days = '/api/v1/shows/days?from=2035-04-01&to=2035-04-03'
+    assert client.get(days).get_json() == {'2035-04-01': 1, '2035-04-02': 1, '2035-04-03': 1}
+
+    # takes artist 1 and its show at venue 2 along
+    assert client.delete('/venues/1').status_code == 200
+    assert client.get(days).get_json() == {'2035-04-01': 0, '2035-04-02': 0, '2035-04-03': 1}
+    assert b'Guns N Petals' not in client.get('/venues/2').data
+    assert client.get('/artists/1').status_code == 404
+    assert b'Guns N Petals' not in client.get('/artists').data
+
+
+def test_bookings_leave_autocomplete_cached_and_touch_per_venue_rows(client, venue, count_queries):
+    db.session.add(Venue(name='Park Square', city='San Francisco', state='CA', address='2 Main St'))
+    db.session.add(Artist(name='Guns N Petals', city='San Francisco', state='CA'))
+    db.session.commit()
+    assert client.get('/api/v1/autocomplete/venues?q=the').get_json() == [{'id': 1, 'name': 'The Musical Hop'}]
+    assert b'The Musical Hop' in client.get('/venues').data
+
+    before = dict(db.session.query(Version.name, Version.value))
+    db.session.add_all([Show(venue_id=1, artist_id=1, start_time=datetime(2035, 4, 1, 20)),
+                        Show(venue_id=2, artist_id=1, start_time=datetime(2035, 4, 2, 20))])
+    db.session.commit()
+    bumped = {name for name, value in db.session.query(Version.name, Version.value) if before.get(name) != value}
+    # each venue's bookings bump their own shard of the listing versions
+    assert {name for name in bumped if name.startswith(('venues', 'shows#'))} == {
+        'venues#1', 'venues#2', 'shows#1', 'shows#2'}
+    assert not bumped & {'venues', 'shows', 'venue-records'}
+
+    response, statements = count_queries(client.get, '/api/v1/autocomplete/venues?q=the')
+    assert len(statements) == 1  # the version check of a cache hit
+    # the directory's upcoming show counts did change: rendered again
+    response, statements = count_queries(client.get, '/venues')
+    assert len(statements) > 1
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Venue, Artist, Show, Version
+
+
+@pytest.fixture
+def shows(app):
+    db.session.add(Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1 Main St'))
+    db.session.add(Artist(name='Guns N Petals', city='San Francisco', state='CA'))
+    db.session.commit()
+    db.session.add_all([Show(venue_id=1, artist_id=1, start_time=datetime(2035, 4, 1, 20)),
+                        Show(venue_id=1, artist_id=1, start_time=datetime(2035, 4, 2, 20))])
+    db.session.commit()
+    # as if the page had been written a while ago, so Last-Modified has
+    # moved on by the time the test changes anything
+    db.session.query(Version).update({'changed_at': datetime.utcnow() - timedelta(hours=1)})
+    db.session.commit()
+
+
+def test_unchanged_shows_page_is_not_modified_from_one_lookup(client, shows, count_queries):
+    first = client.get('/shows')
+    assert first.status_code == 200
+
+    response, statements = count_queries(client.get, '/shows', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 304
+    assert len(statements) == 1
+    assert 'count(' not in statements[0]
+
+    response = client.get('/shows', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 304
+
+
+def test_deleting_a_show_changes_the_shows_validators(client, shows):
+    first = client.get('/shows')
+
+    db.session.delete(db.session.query(Show).filter_by(start_time=datetime(2035, 4, 2, 20)).one())
+    db.session.commit()
+
+    response = client.get('/shows', headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != first.headers['ETag']
+    response = client.get('/shows', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert response.status_code == 200
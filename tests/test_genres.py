@@ -0,0 +1,42 @@
+from models import db, Venue, Artist
+from search import genre_filter
+
+
+def add_artists(*rows):
+    for name, genres in rows:
+        db.session.add(Artist(name=name, city='San Francisco', state='CA', genres=genres))
+    db.session.commit()
+
+
+def matching(genres, match):
+    query = db.session.query(Artist.name).filter(genre_filter(Artist, genres, match))
+    return sorted(name for name, in query)
+
+
+def test_genre_filter_all_and_any(app):
+    add_artists(('Guns N Petals', ['Rock n Roll']),
+                ('Matt Quevedo', ['Jazz']),
+                ('The Wild Sax Band', ['Jazz', 'Classical']))
+
+    assert matching(['Jazz'], 'all') == ['Matt Quevedo', 'The Wild Sax Band']
+    assert matching(['Jazz', 'Classical'], 'all') == ['The Wild Sax Band']
+    assert matching(['Classical', 'Rock n Roll'], 'any') == ['Guns N Petals', 'The Wild Sax Band']
+    assert matching(['Folk'], 'any') == []
+
+
+def test_genre_filtered_listings(client):
+    db.session.add(Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1 Main St',
+                         genres=['Jazz', 'Reggae']))
+    db.session.add(Venue(name='Park Square Live Music & Coffee', city='San Francisco', state='CA',
+                         address='2 Main St', genres=['Folk']))
+    db.session.commit()
+
+    response = client.get('/api/v1/venues?genre=jazz,folk&match=any')
+    assert response.status_code == 200
+    assert len(response.get_json()) == 2
+    response = client.get('/api/v1/venues?genre=reggae')
+    assert [venue['name'] for venue in response.get_json()] == ['The Musical Hop']
+
+    page = client.get('/venues?genre=Folk').get_data(as_text=True)
+    assert 'Park Square Live Music' in page
+    assert 'The Musical Hop' not in page
@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+import geo
+from counters import rebuild_show_counters
+from geo import venues_near
+from models import db, Venue, Artist, Show
+
+
+def nearby_names(latitude, longitude):
+    return [venue['name'] for venue in venues_near(latitude, longitude, miles=50, limit=10)]
+
+
+def test_index_is_rebuilt_for_venue_changes_only(app, tmp_path):
+    db.session.add(Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1 Main St',
+                         latitude=37.77, longitude=-122.42))
+    db.session.add(Venue(name='The Dueling Pianos Bar', city='New York', state='NY', address='2 Main St'))
+    db.session.add(Artist(name='Guns N Petals', city='San Francisco', state='CA'))
+    db.session.commit()
+    assert nearby_names(37.78, -122.41) == ['The Musical Hop']
+    index = geo._index
+
+    # bookings and counter refreshes touch venue rows but not their coordinates
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=datetime.now() + timedelta(days=1)))
+    db.session.commit()
+    rebuild_show_counters()
+    assert nearby_names(37.78, -122.41) == ['The Musical Hop']
+    assert geo._index is index
+
+    lookup = tmp_path / 'places.csv'
+    lookup.write_text('address,city,state,latitude,longitude\n,New York,NY,40.71,-74.01\n')
+    result = app.test_cli_runner().invoke(args=['data', 'geocode', str(lookup)])
+    assert 'Geocoded 1 venues' in result.output
+    assert nearby_names(40.72, -74.0) == ['The Dueling Pianos Bar']
+    assert geo._index is not index
@@ -0,0 +1,68 @@
+import logging
+import re
+from datetime import datetime
+
+import pytest
+
+from models import db, Venue, Artist, Show
+
+
+@pytest.fixture
+def shows(app):
+    db.session.add(Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1 Main St'))
+    db.session.add(Artist(name='Guns N Petals', city='San Francisco', state='CA'))
+    db.session.commit()
+    db.session.add(Show(venue_id=1, artist_id=1, start_time=datetime(2035, 4, 1, 20)))
+    db.session.commit()
+
+
+def recorded(client, endpoint):
+    # (requests, queries) counted for endpoint at /metrics
+    metrics = client.get('/metrics').get_data(as_text=True)
+    requests = sum(int(count) for count in re.findall(
+        rf'fyyur_requests_total{{endpoint="{endpoint}",[^}}]*}} (\d+)', metrics))
+    queries = re.search(rf'fyyur_db_queries_total{{endpoint="{endpoint}"}} (\d+)', metrics)
+    return requests, int(queries.group(1)) if queries else 0
+
+
+def test_server_timing_counts_queries(client, shows):
+    response = client.get('/venues')
+    assert 'db;dur=' in response.headers['Server-Timing']
+    assert re.search(r'desc="[1-9]\d* queries"', response.headers['Server-Timing'])
+
+
+@pytest.mark.parametrize('path, endpoint', [
+    ('/api/v1/venues', 'api.venues'),
+    ('/api/v1/shows', 'api.shows'),
+    ('/shows?stream=1', 'main.shows'),
+])
+def test_streamed_responses_are_recorded_once_sent(client, shows, count_queries, path, endpoint):
+    before = recorded(client, endpoint)
+
+    def fetch():
+        response = client.get(path)
+        return response, response.get_data()
+
+    (response, body), statements = count_queries(fetch)
+    assert response.status_code == 200
+    assert b'Guns N Petals' in body or b'The Musical Hop' in body
+    # nothing is recorded until the body has been sent
+    assert recorded(client, endpoint) == before
+    response.close()
+
+    requests, queries = recorded(client, endpoint)
+    assert requests == before[0] + 1
+    assert queries - before[1] == len(statements) > 0
+
+
+def test_test_configs_keep_out_of_error_log(tmp_path, monkeypatch):
+    from logging import FileHandler
+    from app import create_app
+    from conftest import make_config
+    monkeypatch.chdir(tmp_path)
+    # every app made from this module shares one logger
+    before = list(logging.getLogger('app').handlers)
+    app = create_app(make_config(DEBUG=False, SQLALCHEMY_DATABASE_URI='sqlite://'))
+    assert not [handler for handler in app.logger.handlers
+                if isinstance(handler, FileHandler) and handler not in before]
+    assert not (tmp_path / 'error.log').exists()
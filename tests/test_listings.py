@@ -0,0 +1,135 @@
+import html
+import re
+from datetime import date, datetime, timedelta, timezone
+
+from models import db, Venue, Artist, Show
+
+
+def add_venues(count, cities):
+    for number in range(count):
+        db.session.add(Venue(name=f'Venue {number}', city=f'City {number % cities}', state='CA',
+                             address=f'{number} Main St', genres=['Jazz']))
+    db.session.commit()
+
+
+def add_shows(venue_ids):
+    artist = Artist(name='Guns N Petals', city='San Francisco', state='CA')
+    db.session.add(artist)
+    db.session.flush()
+    start = datetime.now() + timedelta(days=7)
+    # a day apart: one artist can't play two venues at once
+    for day, venue_id in enumerate(venue_ids):
+        db.session.add(Show(venue_id=venue_id, artist_id=artist.id, start_time=start + timedelta(days=day)))
+    db.session.commit()
+
+
+def test_venues_page_query_count_does_not_grow_with_venues(client, count_queries):
+    add_venues(3, cities=2)
+    add_shows([1, 2])
+    response, few = count_queries(client.get, '/venues')
+    assert response.status_code == 200
+
+    add_venues(40, cities=15)
+    add_shows(range(4, 44))
+    response, many = count_queries(client.get, '/venues')
+    assert response.status_code == 200
+    assert response.data.count(b'/venues/') >= 43
+
+    # one grouped query for the whole directory, not one per city or venue
+    assert len(many) == len(few) == 1
+
+
+def test_venues_page_shows_upcoming_counts(client):
+    add_venues(2, cities=1)
+    add_shows([2])
+
+    page = client.get('/venues').get_data(as_text=True)
+    assert 'City 0' in page
+    assert page.count('Upcoming shows 0') == 1
+    assert page.count('Upcoming shows 1') == 1
+
+
+def test_show_time_range_mixes_offsets_and_local_times(client):
+    add_venues(1, cities=1)
+    add_shows([1])
+    start = (datetime.now(timezone.utc) + timedelta(days=6)).isoformat()
+    end = (date.today() + timedelta(days=9)).isoformat()
+
+    for path in ('/api/v1/shows', '/shows'):
+        response = client.get(path, query_string={'from': start, 'to': end})
+        assert response.status_code == 200
+        assert b'Guns N Petals' in response.data
+        response = client.get(path, query_string={'from': end, 'to': start})
+        assert response.status_code == 400
+
+    assert client.get('/api/v1/shows?to=9999-12-31').status_code == 400
+
+
+def test_calendars_reject_dates_at_the_ends_of_the_calendar(client):
+    for day in ('9999-12-15', '0001-01-01'):
+        assert client.get(f'/shows/calendar?date={day}').status_code == 400
+        assert client.get(f'/shows/calendar?view=week&date={day}').status_code == 400
+    assert client.get('/api/v1/shows/days?from=9999-12-30&to=9999-12-31T12:00:00').status_code == 400
+
+    for day in ('9999-11-30', '0001-02-01'):
+        assert client.get(f'/shows/calendar?date={day}').status_code == 200
+        assert client.get(f'/shows/calendar?view=week&date={day}').status_code == 200
+
+
+def walk(client, path):
+    # the page's item titles, then the next page's, following "Next page"
+    # links until there are none
+    pages = []
+    while path:
+        page = client.get(path).get_data(as_text=True)
+        pages.append(re.findall(r'<h5>(?:<a [^>]*>)?([^<]+)<', page))
+        next_link = re.search(r'<li class="next"><a href="([^"]+)"', page)
+        path = next_link and html.unescape(next_link.group(1))
+    return pages
+
+
+def test_detail_pages_split_shows_without_a_query_per_show(client, count_queries):
+    venue = Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1 Main St', genres=['Jazz'])
+    artist = Artist(name='Guns N Petals', city='San Francisco', state='CA', genres=['Rock n Roll'])
+    db.session.add_all([venue, artist])
+    db.session.flush()
+    now = datetime.now()
+    for days in (-30, 30):
+        db.session.add(Show(venue_id=venue.id, artist_id=artist.id, start_time=now + timedelta(days=days)))
+    db.session.commit()
+
+    for path in ('/venues/1', '/artists/1'):
+        response, few = count_queries(client.get, path)
+        page = response.get_data(as_text=True)
+        assert '1 Upcoming Show' in page and '1 Past Show' in page
+
+    for days in (-20, -10, 10, 20):
+        db.session.add(Show(venue_id=venue.id, artist_id=artist.id, start_time=now + timedelta(days=days)))
+    db.session.commit()
+    for path in ('/venues/1', '/artists/1'):
+        response, many = count_queries(client.get, path)
+        page = response.get_data(as_text=True)
+        assert '3 Upcoming Shows' in page and '3 Past Shows' in page
+        assert len(many) == len(few)
+
+
+def test_shows_pages_follow_the_cursor(app, client):
+    app.config['SHOWS_PER_PAGE'] = 2
+    add_venues(5, cities=1)
+    add_shows(range(1, 6))
+
+    # each show is titled by its artist and then its venue, a day apart
+    pages = walk(client, '/shows')
+    assert [page[1::2] for page in pages] == [['Venue 0', 'Venue 1'], ['Venue 2', 'Venue 3'], ['Venue 4']]
+    assert len(walk(client, '/shows?stream=1')) == 3
+
+
+def test_artists_pages_and_letters_ignore_case(app, client):
+    app.config['ARTISTS_PER_PAGE'] = 2
+    for name in ('eve', 'Bob', 'alice', 'Dave', 'carol'):
+        db.session.add(Artist(name=name, city='San Francisco', state='CA', genres=['Jazz']))
+    db.session.commit()
+
+    assert walk(client, '/artists') == [['alice', 'Bob'], ['carol', 'Dave'], ['eve']]
+    assert walk(client, '/artists?letter=c') == walk(client, '/artists?letter=C') == [['carol', 'Dave'], ['eve']]
+    assert '<li  class="active" ><a href="/artists?letter=C"' in client.get('/artists?letter=c').get_data(as_text=True)
@@ -0,0 +1,86 @@
+# Reads of GET requests go to a replica, here a second database that never
+# catches up, so whatever a page shows tells which database it came from.
+import os
+import subprocess
+import sys
+
+import pytest
+
+from models import db, Venue
+
+VENUE_FORM = {'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main St',
+              'genres': ['Jazz']}
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return {'SQLALCHEMY_REPLICA_URIS': [f'sqlite:///{tmp_path}/replica.db'], 'CACHE_BACKEND': 'lru'}
+
+
+@pytest.fixture
+def replica(app):
+    engine = app.extensions['replicas'].engines[0]
+    db.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def venue(app, replica):
+    for bind in (db.engine, replica):
+        with bind.begin() as connection:
+            connection.execute(Venue.__table__.insert().values(
+                id=1, name='The Musical Hop', city='San Francisco', state='CA', address='1 Main St',
+                genres=['Jazz']))
+
+
+def test_reads_go_to_the_replica(client, venue, replica):
+    with replica.begin() as connection:
+        connection.execute(Venue.__table__.update().values(name='Replica Hop'))
+    assert b'Replica Hop' in client.get('/venues/1').data
+    assert b'Replica Hop' in client.get('/api/v1/venues/1').data
+
+
+def test_writer_reads_their_write_past_cache_and_validators(client, venue):
+    assert b'The Musical Hop' in client.get('/venues/1').data
+
+    # following the redirect shows (and consumes) the flashed message
+    response = client.post('/venues/1/edit', data=dict(VENUE_FORM, name='The Musical Hop II'),
+                           follow_redirects=True)
+    assert b'successfully updated' in response.data
+
+    page = client.get('/venues/1')
+    assert b'The Musical Hop II' in page.data
+    assert 'ETag' not in page.headers
+    assert b'The Musical Hop II' in client.get('/venues').data
+
+    # while pinned nothing is served from the cache, not even changes made
+    # without a version bump (such as `flask data refresh-counts`)
+    with db.engine.begin() as connection:
+        connection.execute(Venue.__table__.update().values(name='The Musical Hop III'))
+    assert b'The Musical Hop III' in client.get('/venues').data
+    assert b'The Musical Hop III' in client.get('/venues/1').data
+
+
+def test_other_users_keep_reading_the_replica(app, client, venue):
+    assert b'The Musical Hop' in client.get('/venues').data
+    client.post('/venues/1/edit', data=dict(VENUE_FORM, name='The Musical Hop II'), follow_redirects=True)
+
+    other = app.test_client()
+    page = other.get('/venues').data
+    assert b'The Musical Hop' in page
+    assert b'The Musical Hop II' not in page
+
+
+def test_replicas_require_a_shared_secret_key(tmp_path):
+    # each worker would otherwise sign the pin with a key of its own
+    env = {name: value for name, value in os.environ.items() if name != 'SECRET_KEY'}
+    env['DATABASE_REPLICA_URLS'] = f'sqlite:///{tmp_path}/replica.db'
+    command = [sys.executable, '-c', 'import config']
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(command, env=env, cwd=root, capture_output=True, text=True)
+    assert result.returncode != 0
+    assert 'SECRET_KEY must be set' in result.stderr
+
+    env['SECRET_KEY'] = 'shared'
+    assert subprocess.run(command, env=env, cwd=root, capture_output=True).returncode == 0
@@ -0,0 +1,86 @@
+from models import db, Venue, Artist
+from search import autocomplete, search_with_upcoming_shows
+from versions import bump_versions
+
+
+def add_venues(*rows):
+    for name, city, state, genres in rows:
+        db.session.add(Venue(name=name, city=city, state=state, address='1 Main St', genres=genres))
+    db.session.commit()
+
+
+def names(result):
+    count, data = result
+    return count, sorted(item['name'] for item in data)
+
+
+def test_search_matches_name_city_and_genre(app):
+    add_venues(('The Musical Hop', 'San Francisco', 'CA', ['Jazz', 'Reggae']),
+               ('Park Square Live Music & Coffee', 'San Francisco', 'CA', ['Rock n Roll']),
+               ('The Dueling Pianos Bar', 'New York', 'NY', ['Classical', 'R&B']))
+
+    assert names(search_with_upcoming_shows(Venue, 'Music')) == (
+        2, ['Park Square Live Music & Coffee', 'The Musical Hop'])
+    assert names(search_with_upcoming_shows(Venue, 'new york')) == (1, ['The Dueling Pianos Bar'])
+    # genres match whatever the casing of the term
+    assert names(search_with_upcoming_shows(Venue, 'jazz')) == (1, ['The Musical Hop'])
+    assert names(search_with_upcoming_shows(Venue, 'nothing like it')) == (0, [])
+
+
+def test_search_counts_all_matches_across_pages(app):
+    add_venues(*((f'Hall {number}', 'Austin', 'TX', ['Folk']) for number in range(5)))
+
+    count, data = search_with_upcoming_shows(Venue, 'hall', limit=2, offset=2)
+    assert count == 5
+    assert len(data) == 2
+    # pages past the last match still report the total
+    assert search_with_upcoming_shows(Venue, 'hall', limit=2, offset=6) == (5, [])
+    assert search_with_upcoming_shows(Venue, 'hall', limit=2, offset=6, genres=['Folk']) == (5, [])
+
+
+def test_search_clamps_limit_and_offset(client):
+    add_venues(*((f'Hall {number}', 'Austin', 'TX', ['Folk']) for number in range(5)))
+
+    for query, expected in (('limit=-1', 0), ('offset=-1', 5), ('limit=2&offset=-3', 2), ('limit=100000', 5)):
+        response = client.get(f'/api/v1/search/venues?q=hall&{query}')
+        assert response.status_code == 200, query
+        body = response.get_json()
+        assert body['count'] == 5
+        assert len(body['data']) == expected, query
+    # offset=-1 starts at the best match, as offset=0 does
+    assert (client.get('/api/v1/search/venues?q=hall&offset=-1').get_json()
+            == client.get('/api/v1/search/venues?q=hall').get_json())
+
+    response = client.post('/venues/search', data={'search_term': 'hall', 'limit': '-5', 'offset': '-5'})
+    assert response.status_code == 200
+
+
+def test_search_api_reports_upcoming_show_counts(client):
+    db.session.add(Artist(name='Guns N Petals', city='San Francisco', state='CA', genres=['Rock n Roll'],
+                          upcoming_shows_count=3))
+    db.session.add(Artist(name='Matt Quevedo', city='New York', state='NY', genres=['Jazz']))
+    db.session.commit()
+
+    response = client.get('/api/v1/search/artists?q=petals')
+    assert response.status_code == 200
+    assert response.get_json() == {
+        'count': 1, 'data': [{'id': 1, 'name': 'Guns N Petals', 'num_upcoming_shows': 3}]}
+
+
+def test_indexes_follow_writes_from_other_processes(app, tmp_path):
+    add_venues(('The Musical Hop', 'San Francisco', 'CA', ['Jazz']))
+    assert autocomplete(Venue, 'mus') == [{'id': 1, 'name': 'The Musical Hop'}]
+
+    # a write by another worker reaches this one only through the version
+    with db.engine.begin() as connection:
+        connection.execute(Venue.__table__.insert().values(
+            id=2, name='Music Box', city='Austin', state='TX', address='2 Main St', genres=['Folk']))
+        bump_versions(connection, ['venue-records'])
+    assert autocomplete(Venue, 'mus') == [{'id': 2, 'name': 'Music Box'}, {'id': 1, 'name': 'The Musical Hop'}]
+    assert names(search_with_upcoming_shows(Venue, 'folk')) == (1, ['Music Box'])
+
+    source = tmp_path / 'venues.jsonl'
+    source.write_text('{"id": 3, "name": "Musique", "city": "Austin", "state": "TX", "address": "3 Main St"}\n')
+    result = app.test_cli_runner().invoke(args=['data', 'import', 'venues', str(source)])
+    assert 'Imported 1 venues' in result.output
+    assert [venue['name'] for venue in autocomplete(Venue, 'mus')] == ['Music Box', 'The Musical Hop', 'Musique']
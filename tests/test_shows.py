@@ -0,0 +1,126 @@
+from datetime import datetime
+
+import pytest
+
+from models import db, Venue, Artist, Show
+
+
+@pytest.fixture
+def booked(app):
+    db.session.add(Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1 Main St'))
+    db.session.add(Artist(name='Guns N Petals', city='San Francisco', state='CA'))
+    db.session.commit()
+
+
+def show_form(**values):
+    return dict({'venue_id': '1', 'artist_id': '1', 'start_time': '2035-04-01 20:00:00'}, **values)
+
+
+def test_create_show(client, booked):
+    response = client.post('/shows/create', data=show_form())
+    assert b'Show was successfully listed' in response.data
+    assert db.session.query(Show.start_time).all() == [(datetime(2035, 4, 1, 20),)]
+
+
+def test_create_show_rejects_unknown_ids(client, booked):
+    response = client.post('/shows/create', data=show_form(venue_id='2'))
+    assert b'No venue with this id' in response.data
+
+    # deleted by another worker since this one last looked
+    with db.engine.begin() as connection:
+        connection.execute(Artist.__table__.delete())
+    response = client.post('/shows/create', data=show_form())
+    assert b'No artist with this id' in response.data
+    assert db.session.query(Show).count() == 0
+
+
+
+def test_create_show_rejects_overlapping_shows(client, booked):
+    client.post('/shows/create', data=show_form())
+    db.session.add(Venue(name='Park Square Live Music & Coffee', city='San Francisco', state='CA',
+                         address='2 Main St'))
+    db.session.add(Artist(name='Matt Quevedo', city='New York', state='NY'))
+    db.session.commit()
+
+    response = client.post('/shows/create', data=show_form(artist_id='2', start_time='2035-04-01 20:30:00'))
+    assert b'the venue already has a show at that time (starting 2035-04-01 20:00)' in response.data
+    response = client.post('/shows/create', data=show_form(venue_id='2', start_time='2035-04-01 19:00:00'))
+    assert b'the artist already has a show at that time (starting 2035-04-01 20:00)' in response.data
+    assert db.session.query(Show).count() == 1
+
+    # back to back is not an overlap
+    response = client.post('/shows/create', data=show_form(artist_id='2', start_time='2035-04-01 22:00:00',
+                                                           duration_minutes='60'))
+    assert b'Show was successfully listed' in response.data
+
+@pytest.mark.parametrize('start_time', ['9999-12-31T23:00:00', '0001-01-01T01:00:00'])
+def test_schedule_rejects_start_times_at_the_ends_of_the_calendar(client, booked, start_time):
+    response = client.post('/api/v1/shows', json={'mode': 'best_effort', 'shows': [
+        {'venue_id': 1, 'artist_id': 1, 'start_time': start_time},
+        {'venue_id': 1, 'artist_id': 1, 'start_time': '2035-04-01T20:00:00'},
+    ]})
+    assert response.status_code == 201
+    first, second = response.get_json()['results']
+    assert first['status'] == 'error'
+    assert first['error'] == 'start_time must fall between 0001-01-02 and 9999-12-30'
+    assert second['status'] == 'created'
+
+
+def test_create_show_rejects_start_times_at_the_ends_of_the_calendar(client, booked):
+    response = client.post('/shows/create', data=show_form(start_time='9999-12-31 23:00:00'))
+    assert b'start_time must fall between 0001-01-02 and 9999-12-30' in response.data
+    assert db.session.query(Show).count() == 0
+
+
+def test_import_rejects_bad_names_and_overlapping_shows(app, booked, tmp_path):
+    source = tmp_path / 'shows.jsonl'
+    source.write_text(
+        '{"venue_id": 1, "artist_id": 1, "start_time": "2035-04-01T20:00:00"}\n'
+        '{"venue_name": 5, "artist_id": 1, "start_time": "2035-04-03T20:00:00"}\n'
+        '{"venue_id": 1, "artist_id": 1, "start_time": "2035-04-01T21:00:00"}\n'
+        '{"venue_name": "The Musical Hop", "artist_id": 1, "start_time": "2035-04-02T20:00:00"}\n'
+        '{"venue_id": 1, "artist_id": 1, "start_time": "9999-12-31T23:00:00"}\n'
+    )
+    result = app.test_cli_runner().invoke(args=['data', 'import', 'shows', str(source)])
+    assert 'line 2: venue_name is not a string: 5' in result.output
+    assert 'line 3: the venue already has a show at that time (starting 2035-04-01 20:00)' in result.output
+    assert 'line 5: start_time must fall between 0001-01-02 and 9999-12-30' in result.output
+    assert 'Imported 2 shows, 3 rows rejected.' in result.output
+
+    # and against the shows already booked
+    source.write_text('{"venue_id": 1, "artist_id": 1, "start_time": "2035-04-02T19:00:00"}\n')
+    result = app.test_cli_runner().invoke(args=['data', 'import', 'shows', str(source)])
+    assert 'line 1: the venue already has a show at that time (starting 2035-04-02 20:00)' in result.output
+    assert 'Imported 0 shows, 1 rows rejected.' in result.output
+    assert db.session.query(Show).count() == 2
+
+
+def schedule(client, mode, *rules):
+    # one show a day from 2035-04-01, with the given rrules
+    return client.post('/api/v1/shows', json={'mode': mode, 'shows': [
+        {'venue_id': 1, 'artist_id': 1, 'start_time': f'2035-04-{day:02}T20:00:00', 'rrule': rule}
+        for day, rule in enumerate(rules, start=1)]})
+
+
+def test_schedule_best_effort_creates_the_valid_shows(client, booked):
+    response = schedule(client, 'best_effort', None, 5, 'FREQ=WEEKLY;COUNT=2')
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['created'] == 3
+    assert [(result['item'], result['status']) for result in body['results']] == [
+        (0, 'created'), (1, 'error'), (2, 'created'), (2, 'created')]
+    assert body['results'][1]['error'] == 'rrule is not a string'
+    assert db.session.query(Show).count() == 3
+
+
+def test_schedule_atomic_creates_nothing_when_a_show_fails(client, booked):
+    response = schedule(client, 'atomic', None, {'FREQ': 'DAILY'}, 'FREQ=WEEKLY;COUNT=2')
+    assert response.status_code == 422
+    body = response.get_json()
+    assert body['created'] == 0
+    assert [result['status'] for result in body['results']] == ['skipped', 'error', 'skipped', 'skipped']
+    assert db.session.query(Show).count() == 0
+
+    response = schedule(client, 'atomic', None, 'FREQ=WEEKLY;COUNT=2')
+    assert response.status_code == 201
+    assert response.get_json()['created'] == 3
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Venue, Artist, Show
+
+
+@pytest.fixture
+def booked(app):
+    # artist 1 plays both venues, artist 2 only venue 2
+    for number in (1, 2):
+        db.session.add(Venue(name=f'Venue {number}', city='San Francisco', state='CA', address=f'{number} Main St'))
+        db.session.add(Artist(name=f'Artist {number}', city='San Francisco', state='CA'))
+    db.session.commit()
+    start = datetime.now() + timedelta(days=7)
+    db.session.add_all([Show(venue_id=1, artist_id=1, start_time=start),
+                        Show(venue_id=2, artist_id=1, start_time=start + timedelta(days=1)),
+                        Show(venue_id=2, artist_id=2, start_time=start + timedelta(days=2))])
+    db.session.commit()
+
+
+def counters(model):
+    return {entity.id: (entity.upcoming_shows_count, entity.past_shows_count)
+            for entity in db.session.query(model).populate_existing()}
+
+
+def test_deleting_a_venue_keeps_the_counters_of_what_remains(client, booked):
+    assert client.delete('/venues/1').status_code == 200
+
+    # the cascade takes artist 1, and with it its show at venue 2
+    assert db.session.query(Show.venue_id, Show.artist_id).all() == [(2, 2)]
+    assert counters(Venue) == {2: (1, 0)}
+    assert counters(Artist) == {2: (1, 0)}
@@ -0,0 +1,78 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Version
+
+
+# Anything cached in a worker (rendered pages, search indexes, the venue
+# KD-tree) records the versions of the tags it was built from, and is reused
+# only while they are unchanged. Writes bump the versions of the tags they
+# affect in their own transaction: ORM flushes through cache.py, bulk writes
+# through cache.collect_tags. A name never bumped is at version 0.
+#
+# The listing tags ('venues', 'artists', 'shows') change with every write of
+# their kind. As single rows, their locks would queue concurrent writers
+# until each commits, so each is kept as SHARDS rows: a write bumps the one
+# its entity id picks (shard_name), and reads add them up.
+
+SHARDED = frozenset({'venues', 'artists', 'shows'})
+SHARDS = 16
+
+
+def shard_name(name, key):
+    # the row of sharded tag `name` a write to entity `key` bumps; records
+    # inserted in bulk without an id yet share shard 0
+    return f'{name}#{(key or 0) % SHARDS}'
+
+
+def unsharded(name):
+    # 'shows#3' -> 'shows'
+    return name.partition('#')[0]
+
+
+def _row_names(name):
+    return [shard_name(name, key) for key in range(SHARDS)] if name in SHARDED else [name]
+
+
+def read_versions(names):
+    # {name: version} for `names`, in one primary key lookup; a sharded
+    # name's version is the sum of its shards, which grows with any of them
+    names = sorted(set(names))
+    if not names:
+        return {}
+    rows = [row_name for name in names for row_name in _row_names(name)]
+    found = dict(db.session.query(Version.name, Version.value).filter(Version.name.in_(rows)))
+    return {name: sum(found.get(row_name, 0) for row_name in _row_names(name)) for name in names}
+
+
+def read_version(name):
+    # (version, when it was last bumped, naive UTC) for `name`; (0, None) if
+    # it never was
+    rows = (db.session.query(Version.value, Version.changed_at)
+            .filter(Version.name.in_(_row_names(name))).all())
+    if not rows:
+        return 0, None
+    return sum(value for value, _ in rows), max(changed_at for _, changed_at in rows)
+
+
+def bump_versions(connection, names):
+    # one upsert for all names; rows are locked in name order, so concurrent
+    # writers bumping overlapping names wait for each other rather than deadlock
+    if not names:
+        return
+    # a sharded name given whole (no entity to pick a shard) bumps shard 0
+    names = {shard_name(name, 0) if name in SHARDED else name for name in names}
+    table = Version.__table__
+    insert = (postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert)(table)
+    now = datetime.utcnow()
+    connection.execute(
+        insert.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={'value': table.c.value + 1, 'changed_at': insert.excluded.changed_at},
+        ),
+        [{'name': name, 'value': 1, 'changed_at': now} for name in sorted(set(names))],
+    )
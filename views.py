@@ -0,0 +1,607 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+import calendar
+import functools
+import string
+from datetime import date, datetime, time, timedelta
+
+from flask import (Blueprint, Response, abort, current_app, flash, redirect, render_template,
+                   request, stream_with_context, url_for)
+
+from forms import GENRES, ShowForm, ScheduleShowsForm, VenueForm, ArtistForm, parse_genre_args
+from models import db, session_scope, Venue, Show, Artist, DEFAULT_SHOW_MINUTES
+from search import genre_filter, search_with_upcoming_shows
+from pagination import KeysetPage, decode_cursor
+from cache import collect_tags, response_cache
+from conditional import conditional, venue_validators, artist_validators, shows_validators
+from queries import (venue_directory, venue_detail, artist_detail, parse_time_range, time_range_filter,
+                     show_day_counts, shows_between, FIRST_CALENDAR_DATE, LAST_CALENDAR_DATE)
+from conflicts import find_conflict
+from counters import adjust_show_counters
+from scheduling import schedule_shows
+from serializers import artist_serializer, show_serializer
+
+
+# the HTML pages; the JSON API is in api.py
+main = Blueprint('main', __name__)
+
+
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def compiled_datetime_pattern(format, locale):
+    # parse the Babel pattern and locale once per (format, locale); Babel is
+    # imported here so that it only loads once a page formats a date
+    import babel
+    import babel.dates
+    pattern = babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+    return pattern, babel.Locale.parse(locale)
+
+
+@functools.lru_cache(maxsize=4096)
+def format_datetime_cached(date, format, locale):
+    # listings repeat the same start times, so formatted strings are memoized
+    pattern, babel_locale = compiled_datetime_pattern(format, locale)
+    return pattern.apply(date, babel_locale)
+
+
+@main.app_template_filter('datetime')
+def format_datetime(value, format='medium'):
+    # views pass datetime objects; strings are still accepted
+    if isinstance(value, str):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    return format_datetime_cached(value, format, 'en')
+
+
+def time_range():
+    # ?from= / ?to= of the show listings, see parse_time_range
+    try:
+        return parse_time_range(request.args)
+    except ValueError as error:
+        abort(400, description=str(error))
+
+
+def stream_template(template_name, **context):
+    # renders a template incrementally, see Flask's "Streaming Contents" pattern
+    current_app.update_template_context(context)
+    template = current_app.jinja_env.get_template(template_name)
+    return Response(stream_with_context(template.generate(context)))
+
+
+#----------------------------------------------------------------------------#
+# Controllers.
+#----------------------------------------------------------------------------#
+
+@main.route('/')
+def index():
+    return render_template('pages/home.html')
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@main.route('/venues')
+@response_cache.cached('venues')
+def venues():
+    # COMPLETED: replace with real venues data.
+    # num_upcoming_shows should be aggregated based on number of upcoming shows per venue. Now displayed in template.
+    genres, match = parse_genre_args(request.args)
+    data = venue_directory(genres, match)
+
+    return render_template('pages/venues.html', areas=data, genres=GENRES, selected_genres=genres)
+
+
+@main.route('/venues/search', methods=['POST'])
+def search_venues():
+    # COMPLETED: implement search on venues with partial string search. Ensure it is case-insensitive.
+    # seach for Hop should return "The Musical Hop".
+    # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+
+    search_term = request.form.get('search_term', '')
+    genres, match = parse_genre_args(request.values)
+    count, data = search_with_upcoming_shows(Venue, search_term,
+                                             limit=request.values.get('limit', type=int),
+                                             offset=request.values.get('offset', 0, type=int),
+                                             genres=genres, match=match)
+
+    response = {
+        "count": count,
+        "data": data}
+
+    return render_template('pages/search_venues.html', results=response,
+                           search_term=request.form.get('search_term', ''))
+
+
+@main.route('/venues/<int:venue_id>')
+@conditional(venue_validators)
+@response_cache.cached('venue:{venue_id}')
+def show_venue(venue_id):
+    # COMPLETED: replace with real venue data from the venues table, using venue_id
+    start, end = time_range()
+    data = venue_detail(venue_id, start=start, end=end)
+    if data is None:
+        abort(404)
+    response_cache.tag(*(f'artist-info:{show["artist_id"]}'
+                         for show in data["past_shows"] + data["upcoming_shows"]))
+
+    return render_template('pages/show_venue.html', venue=data)
+
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@main.route('/venues/create', methods=['GET'])
+def create_venue_form():
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+
+
+@main.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+    # COMPLETED: insert form data as a new Venue record in the db, instead
+    # setting csrf to false so that form can validate with a facebook url
+    form = VenueForm(request.form, meta={'csrf': False})
+    if form.validate():
+        name = form.name.data
+        city = form.city.data
+        state = form.state.data
+        address = form.address.data
+        phone = form.phone.data
+        image_link = form.image_link.data
+        genres = form.genres.data
+        facebook_link = form.facebook_link.data
+        website_link = form.website_link.data
+        seeking_talent = form.seeking_talent.data
+        seeking_description = form.seeking_description.data
+
+        new_venue = Venue(
+            name=name, city=city, state=state, address=address, phone=phone,
+            image_link=image_link, genres=genres, facebook_link=facebook_link,
+            website_link=website_link, seeking_talent=seeking_talent,
+            seeking_description=seeking_description
+        )
+        # Create Venue object and commit to database
+        with session_scope() as scope:
+            db.session.add(new_venue)
+
+        # COMPLETED: modify data to be the data object returned from db insertion
+        if scope.ok:
+            # on successful db insert, flash success
+            flash('Venue ' + new_venue.name + ' was successfully listed!')
+        else:
+            # COMPLETED: on unsuccessful db insert, flash an error instead.
+            # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+            flash('An error occurred. Venue ' + form.name.data + ' could not be listed.')
+    else:
+        message = []
+        for field, error in form.errors.items():
+            message.append(field + " : " + error[0])
+        flash('Errors occurred: ' + str(message) + ' ' + form.name.data + ' could not be listed')
+    return render_template('pages/home.html')
+
+
+def cascaded_shows(venue):
+    # the shows deleting `venue` removes: its own, and those of its artists
+    # anywhere else
+    artist_ids = [artist.id for artist in venue.artists]
+    rows = (db.session.query(Show.venue_id, Show.artist_id, Show.start_time)
+            .filter(db.or_(Show.venue_id == venue.id, Show.artist_id.in_(artist_ids))))
+    return [Show(venue_id=show_venue_id, artist_id=artist_id, start_time=start_time)
+            for show_venue_id, artist_id, start_time in rows]
+
+
+@main.route('/venues/<venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+    # COMPLETED: Complete this endpoint for taking a venue_id, and using
+    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    venue = Venue.query.get_or_404(venue_id)
+    venue_name = venue.name
+    with session_scope() as scope:
+        # the delete cascades to the venue's artists and every show of theirs
+        # through the show table, where the Show events never see the rows:
+        # take the shows out of the counters, and out of the cache, first
+        shows = cascaded_shows(venue)
+        adjust_show_counters(db.session.connection(), shows, -1)
+        collect_tags(db.session, shows + list(venue.artists))
+        db.session.delete(venue)
+
+    if scope.ok:
+        flash('Venue ' + venue_name + ' was successfully deleted')
+    else:
+        flash('Venue could not be deleted')
+    return render_template('pages/home.html')
+
+    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+    # clicking that button delete it from the db then redirect the user to the homepage
+
+
+
+#  Artists
+#  ----------------------------------------------------------------
+@main.route('/artists')
+@response_cache.cached('artists')
+def artists():
+    # COMPLETED: replace with real data returned from querying the database
+    # keyset pagination on (upper(name), id), selecting only the columns the
+    # list shows, so a page costs the same however many artists there are;
+    # the upper-cased sort key files "dj Shadow" under D rather than after Z
+    sort_name = db.func.upper(Artist.name).label('sort_name')
+    key_columns = (sort_name, Artist.id)
+    cursor = request.args.get('after')
+    if cursor is not None:
+        cursor = decode_cursor(cursor, (str, int))
+
+    fields = ['id', 'name']
+    queried_artists = db.session.query(*artist_serializer.select(fields), sort_name)
+
+    # alphabetical jump links start the listing at the first name >= letter,
+    # whatever the case of either
+    letter = request.args.get('letter', '')[:1].upper()
+    if cursor is None and letter:
+        queried_artists = queried_artists.filter(db.func.upper(Artist.name) >= letter)
+
+    genres, match = parse_genre_args(request.args)
+    if genres:
+        queried_artists = queried_artists.filter(genre_filter(Artist, genres, match))
+
+    page = KeysetPage(queried_artists, key_columns, cursor, current_app.config['ARTISTS_PER_PAGE'],
+                      lambda artist: artist_serializer.dump(artist, fields))
+
+    return render_template('pages/artists.html', artists=page, page=page, letters=string.ascii_uppercase,
+                           letter=letter, genres=GENRES, selected_genres=genres)
+
+
+@main.route('/artists/search', methods=['POST'])
+def search_artists():
+
+    # COMPLETED: implement search on artists with partial string search. Ensure it is case-insensitive.
+    # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+    # search for "band" should return "The Wild Sax Band".
+    search_term = request.form.get('search_term', '')
+    genres, match = parse_genre_args(request.values)
+    count, data = search_with_upcoming_shows(Artist, search_term,
+                                             limit=request.values.get('limit', type=int),
+                                             offset=request.values.get('offset', 0, type=int),
+                                             genres=genres, match=match)
+
+    response = {
+        "count": count,
+        "data": data}
+
+    return render_template('pages/search_artists.html', results=response,
+                           search_term=request.form.get('search_term', ''))
+
+
+@main.route('/artists/<int:artist_id>')
+@conditional(artist_validators)
+@response_cache.cached('artist:{artist_id}')
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    # COMPLETED: replace with real artist data from the artist table, using artist_id
+    start, end = time_range()
+    data = artist_detail(artist_id, start=start, end=end)
+    if data is None:
+        abort(404)
+    response_cache.tag(*(f'venue-info:{show["venue_id"]}'
+                         for show in data["past_shows"] + data["upcoming_shows"]))
+
+    return render_template('pages/show_artist.html', artist=data)
+
+
+#  Update
+#  ----------------------------------------------------------------
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+
+    # COMPLETED: populate form with fields from artist with ID <artist_id>
+
+    fetched_artist = Artist.query.get_or_404(artist_id)
+    form = ArtistForm(obj=fetched_artist)
+    return render_template('forms/edit_artist.html', form=form, artist=fetched_artist)
+
+
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+    # COMPLETED: take values from the form submitted, and update existing
+    # artist record with ID <artist_id> using the new attributes
+    form = ArtistForm(request.form, meta={'csrf': False})
+    artist = Artist.query.get_or_404(artist_id)
+
+    if form.validate():
+
+        with session_scope() as scope:
+            artist.name = form.name.data
+            artist.city = form.city.data
+            artist.state = form.state.data
+            artist.phone = form.phone.data
+            artist.image_link = form.image_link.data
+            artist.genres = form.genres.data
+            artist.facebook_link = form.facebook_link.data
+            artist.website_link = form.website_link.data
+            artist.seeking_venue = form.seeking_venue.data
+            artist.seeking_description = form.seeking_description.data
+
+        if scope.ok:
+            # on successful db insert, flash success
+            flash('Artist ' + artist.name + ' was successfully updated!')
+        else:
+            # COMPLETED: on unsuccessful db insert, flash an error instead.
+            # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+            flash('An error occurred. Artist ' + form.name.data + ' could not be updated.')
+
+    else:
+        message = []
+        for field, error in form.errors.items():
+            message.append(field + " : " + error[0])
+        flash('Errors occurred: ' + str(message) + ' ' + form.name.data + ' could not be edited')
+
+    return redirect(url_for('.show_artist', artist_id=artist_id))
+
+
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+    # COMPLETED: populate form with values from venue with ID <venue_id>
+    # form = VenueForm(request.form)
+    fetched_venue = Venue.query.get_or_404(venue_id)
+    form = VenueForm(obj=fetched_venue)
+
+    return render_template('forms/edit_venue.html', form=form, venue=fetched_venue)
+
+
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+    # COMPLETED: take values from the form submitted, and update existing
+    # venue record with ID <venue_id> using the new attributes
+    form = VenueForm(request.form, meta={'csrf': False})
+    venue = Venue.query.get_or_404(venue_id)
+    if form.validate():
+        with session_scope() as scope:
+            if (venue.address, venue.city, venue.state) != (form.address.data, form.city.data, form.state.data):
+                # moved: geocoded again by the next `flask data geocode`
+                venue.latitude = venue.longitude = None
+            venue.name = form.name.data
+            venue.city = form.city.data
+            venue.state = form.state.data
+            venue.address = form.address.data
+            venue.phone = form.phone.data
+            venue.image_link = form.image_link.data
+            venue.genres = form.genres.data
+            venue.facebook_link = form.facebook_link.data
+            venue.website_link = form.website_link.data
+            venue.seeking_talent = form.seeking_talent.data
+            venue.seeking_description = form.seeking_description.data
+
+        if scope.ok:
+            # on successful db insert, flash success
+            flash('Venue ' + venue.name + ' was successfully updated!')
+        else:
+            # COMPLETED: on unsuccessful db insert, flash an error instead.
+            # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+            flash('An error occurred. Venue ' + form.name.data + ' could not be updated.')
+    else:
+        message = []
+        for field, error in form.errors.items():
+            message.append(field + " : " + error[0])
+        flash('Errors occurred: ' + str(message) + ' ' + form.name.data + ' could not be edited')
+    return redirect(url_for('.show_venue', venue_id=venue_id))
+
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@main.route('/artists/create', methods=['GET'])
+def create_artist_form():
+    form = ArtistForm()
+
+    return render_template('forms/new_artist.html', form=form)
+
+
+@main.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+    # called upon submitting the new artist listing form
+    # COMPLETED: insert form data as a new Venue record in the db, instead
+    # setting csrf to false so that form can validate with a facebook url
+    form = ArtistForm(request.form, meta={'csrf': False})
+    if form.validate():
+
+        name = form.name.data
+        city = form.city.data
+        state = form.state.data
+        phone = form.phone.data
+        genres = form.genres.data
+        facebook_link = form.facebook_link.data
+        image_link = form.image_link.data
+        website_link = form.website_link.data
+        seeking_venue = form.seeking_venue.data
+        seeking_description = form.seeking_description.data
+
+        new_artist = Artist(
+            name=name, city=city, state=state, phone=phone,
+            image_link=image_link, genres=genres, facebook_link=facebook_link,
+            website_link=website_link, seeking_venue=seeking_venue,
+            seeking_description=seeking_description
+        )
+        # Create Artist object and commit to database
+        with session_scope() as scope:
+            db.session.add(new_artist)
+
+        if scope.ok:
+            # on successful db insert, flash success
+            flash('Artist ' + new_artist.name + ' was successfully listed!')
+        else:
+            # COMPLETED: on unsuccessful db insert, flash an error instead.
+            # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+            flash('An error occurred. Artist ' + form.name.data + ' could not be listed.')
+    else:
+        message = []
+        for field, error in form.errors.items():
+            message.append(field + " : " + error[0])
+        flash('Errors occurred: ' + str(message) + ' ' + form.name.data + ' could not be listed')
+
+    return render_template('pages/home.html')
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@main.route('/shows')
+@conditional(shows_validators)
+@response_cache.cached('shows')
+def shows():
+    # displays list of shows at /shows
+    # COMPLETED: replace with real venues data.
+
+    # keyset pagination on (start_time, venue_id, artist_id): each page seeks
+    # straight past the cursor instead of loading the whole show history
+    key_columns = (Show.start_time, Show.venue_id, Show.artist_id)
+    cursor = request.args.get('after')
+    if cursor is not None:
+        cursor = decode_cursor(cursor, (datetime.fromisoformat, int, int))
+
+    # join query, selecting only the columns the page renders, limited to
+    # ?from= / ?to= when given
+    start, end = time_range()
+    queried_shows = (db.session.query(*show_serializer.select())
+                     .join(Venue, Venue.id == Show.venue_id)
+                     .join(Artist, Artist.id == Show.artist_id)
+                     .filter(*time_range_filter(start, end)))
+
+    page = KeysetPage(queried_shows, key_columns, cursor, current_app.config['SHOWS_PER_PAGE'], show_serializer.dump)
+
+    # ?stream=1 sends the page as it renders rather than building it in memory
+    if request.args.get('stream', type=int):
+        return stream_template('pages/shows.html', shows=page, page=page)
+    return render_template('pages/shows.html', shows=page, page=page)
+
+
+@main.route('/shows/calendar')
+@response_cache.cached('shows')
+def show_calendar():
+    # ?view=month (show counts per day) or ?view=week (the shows themselves),
+    # around ?date= (default: today)
+    view = 'week' if request.args.get('view') == 'week' else 'month'
+    try:
+        day = date.fromisoformat(request.args['date']) if request.args.get('date') else date.today()
+    except ValueError:
+        abort(400, description='date must be YYYY-MM-DD')
+    if not FIRST_CALENDAR_DATE <= day <= LAST_CALENDAR_DATE:
+        abort(400, description=f'date must be between {FIRST_CALENDAR_DATE} and {LAST_CALENDAR_DATE}')
+
+    if view == 'month':
+        weeks = calendar.Calendar().monthdatescalendar(day.year, day.month)
+        first = day.replace(day=1)
+        return render_template('pages/calendar.html', view=view, day=day, weeks=weeks,
+                               counts=show_day_counts(weeks[0][0], weeks[-1][-1]),
+                               previous_date=(first - timedelta(days=1)).replace(day=1),
+                               next_date=(first + timedelta(days=31)).replace(day=1))
+
+    first = day - timedelta(days=day.weekday())
+    days = [first + timedelta(days=offset) for offset in range(7)]
+    week_shows = {week_day: [] for week_day in days}
+    for show in shows_between(datetime.combine(first, time.min), datetime.combine(first + timedelta(days=7), time.min)):
+        week_shows[show['start_time'].date()].append(show)
+    return render_template('pages/calendar.html', view=view, day=day, days=days, week_shows=week_shows,
+                           previous_date=first - timedelta(days=7), next_date=first + timedelta(days=7))
+
+
+@main.route('/shows/create')
+def create_shows():
+    # renders form. do not touch.
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+
+@main.route('/shows/create', methods=['POST'])
+def create_show_submission():
+    # called to create new shows in the db, upon submitting new show listing form
+    # COMPLETED: insert form data as a new Show record in the db, instead
+    form = ShowForm(request.form, meta={'csrf': False})
+    if form.validate():
+
+        venue_id = form.venue_id.data
+        artist_id = form.artist_id.data
+        start_time = form.start_time.data
+        duration_minutes = form.duration_minutes.data or DEFAULT_SHOW_MINUTES
+
+        conflict = find_conflict(venue_id, artist_id, start_time, duration_minutes)
+        if conflict:
+            flash('Show could not be listed: ' + conflict)
+            return render_template('pages/home.html')
+
+        new_show = Show(venue_id=venue_id, artist_id=artist_id, start_time=start_time,
+                        duration_minutes=duration_minutes)
+
+        with session_scope() as scope:
+            db.session.add(new_show)
+
+        if scope.ok:
+            # on successful db insert, flash success
+            flash('Show was successfully listed!')
+        else:
+            # COMPLETED: on unsuccessful db insert, flash an error instead.
+            flash('An error occurred. Show could not be listed.')
+    else:
+        message = []
+        for field, error in form.errors.items():
+            message.append(field + " : " + error[0])
+        flash('Errors occurred: ' + str(message) + ' show could not be listed')
+
+
+    return render_template('pages/home.html')
+
+
+@main.route('/shows/schedule')
+def schedule_shows_form():
+    form = ScheduleShowsForm()
+    return render_template('forms/schedule_shows.html', form=form, results=None)
+
+
+@main.route('/shows/schedule', methods=['POST'])
+def schedule_shows_submission():
+    # many shows at once, e.g. a tour: validated together and inserted with
+    # multi-row INSERTs (see scheduling.py)
+    form = ScheduleShowsForm(request.form, meta={'csrf': False})
+    results = None
+    if form.validate():
+        items = []
+        for line in form.shows.data.splitlines():
+            if line.strip():
+                parts = [part.strip() for part in line.split(',', 2)]
+                item = dict(zip(('venue_id', 'artist_id', 'start_time'), parts))
+                item['duration_minutes'] = form.duration_minutes.data or DEFAULT_SHOW_MINUTES
+                if form.rrule.data:
+                    item['rrule'] = form.rrule.data
+                items.append(item)
+        try:
+            created, results = schedule_shows(items, form.mode.data)
+        except ValueError as error:
+            flash('Shows could not be scheduled: ' + str(error))
+        else:
+            flash(f'{created} of {len(results)} shows were successfully listed!')
+    else:
+        message = []
+        for field, error in form.errors.items():
+            message.append(field + " : " + error[0])
+        flash('Errors occurred: ' + str(message) + ' shows could not be scheduled')
+
+    return render_template('forms/schedule_shows.html', form=form, results=results)
+
+
+@main.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+
+@main.app_errorhandler(500)
+def server_error(error):
+    return render_template('errors/500.html'), 500